@@ -0,0 +1,128 @@
+import pandas as pd
+
+from typing import Any, Callable, Dict, NamedTuple, Optional, Tuple
+
+from sampling import (
+    approximate_sales_percentage_by_region,
+    approximate_sales_by_day_of_the_week,
+    draw_preview_sample,
+)
+from sketches import SalesSketches, build_sketches
+from utils import (
+    ZERO_SALES_PREDICTION,
+    calculate_sales_percentage_by_region,
+    calculate_sales_per_month,
+    calculate_sales_by_month,
+    calculate_data_indicators,
+    WeeklyProductSales,
+    build_weekly_product_sales,
+    calculate_sales_vs_prediction_gauges,
+    calculate_daily_sales_by_region,
+    calculate_sales_by_day_of_the_week,
+)
+
+
+class Aggregation(NamedTuple):
+    """
+    What a `calculate_*` function needs from the sales data.
+
+    The functions only sum 'Ventas' and 'Prediccion', so they return the same result when
+    they are given the data already summed by their group-by keys at their time grain
+    (or any finer one), after applying their row filter. A grain of None means that the
+    function needs the rows themselves, it is given the filtered rows without summing.
+
+    When `prepare` is set, the function is given its result instead of the scanned data.
+    It is computed once per scan and shared by every function with the same `prepare`.
+
+    `window` marks the functions that only look at last week and this week, they are
+    given the rows of that window when they are loaded on their own. `columnar` marks the
+    functions that can keep their result as `ChartData` until it is published.
+    """
+
+    function: Callable[..., Any]
+    grain: Optional[str]
+    columns: Callable[[dict], Tuple[str, ...]]
+    filter: Optional[str]
+    prepare: Optional[Callable[[pd.DataFrame], Any]] = None
+    window: bool = False
+    columnar: bool = True
+
+
+# Columns added to the rows before every scan, summed along with 'Ventas' and
+# 'Prediccion'. The prediction of the rows without sales lets the indicators and the
+# monthly sales replace those sales by the prediction after summing.
+DERIVED_VALUES: Dict[str, Callable[[pd.DataFrame], pd.Series]] = {
+    ZERO_SALES_PREDICTION: lambda frame: frame["Prediccion"].where(
+        frame["Ventas"] == 0, 0
+    ),
+}
+
+# Columns summed by every scan
+SCAN_VALUES = ["Ventas", ZERO_SALES_PREDICTION, "Prediccion"]
+
+# The weekly product bars keep the last row of each product and week, and the sketches
+# and the approximate charts sample the rows, so they are given the rows themselves
+AGGREGATIONS = {
+    "calculate_sales_by_day_of_the_week": Aggregation(
+        calculate_sales_by_day_of_the_week, "D", lambda args: (), None, window=True
+    ),
+    "calculate_data_indicators": Aggregation(
+        calculate_data_indicators,
+        "D",
+        lambda args: ("Producto",),
+        None,
+        window=True,
+    ),
+    "calculate_sales_vs_prediction_gauges": Aggregation(
+        calculate_sales_vs_prediction_gauges,
+        "D",
+        lambda args: ("Región", "Producto"),
+        None,
+        window=True,
+        columnar=False,
+    ),
+    "calculate_sales_percentage_by_region": Aggregation(
+        calculate_sales_percentage_by_region, "M", lambda args: ("Región",), None
+    ),
+    "calculate_sales_by_month": Aggregation(
+        calculate_sales_by_month, "M", lambda args: ("Producto",), None
+    ),
+    "calculate_sales_per_month": Aggregation(
+        calculate_sales_per_month, "M", lambda args: (), None, columnar=False
+    ),
+    "calculate_daily_sales_by_region": Aggregation(
+        calculate_daily_sales_by_region, "D", lambda args: ("Región", "Producto"), None
+    ),
+    "calculate_sale_by_region_group_by_date": Aggregation(
+        WeeklyProductSales.records,
+        None,
+        lambda args: (),
+        None,
+        build_weekly_product_sales,
+        columnar=False,
+    ),
+    "sketch_quantiles": Aggregation(
+        SalesSketches.records,
+        None,
+        lambda args: (),
+        None,
+        build_sketches,
+        columnar=False,
+    ),
+    "approximate_sales_percentage_by_region": Aggregation(
+        approximate_sales_percentage_by_region,
+        None,
+        lambda args: (),
+        None,
+        draw_preview_sample,
+        columnar=False,
+    ),
+    "approximate_sales_by_day_of_the_week": Aggregation(
+        approximate_sales_by_day_of_the_week,
+        None,
+        lambda args: (),
+        None,
+        draw_preview_sample,
+        columnar=False,
+    ),
+}
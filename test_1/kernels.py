@@ -0,0 +1,168 @@
+import pandas as pd
+import numpy as np
+
+import timeit
+from typing import List, Optional, Sequence, Tuple
+
+# Columns summed by every aggregation in the utils
+VALUE_COLUMNS = ["Ventas", "Prediccion"]
+
+# Key columns with few distinct values, stored as categoricals so that their integer
+# codes are computed once instead of on every aggregation
+KEY_COLUMNS = ["Producto", "Región"]
+
+
+def encode_keys(sales_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Factorize the product and region columns once by converting them to categoricals.
+
+    Args:
+        sales_df (pd.DataFrame): The sales data.
+
+    Returns:
+        pd.DataFrame: The same data with categorical 'Producto' and 'Región' columns.
+    """
+    return sales_df.astype({column: "category" for column in KEY_COLUMNS})
+
+
+def factorize(key: pd.Series) -> Tuple[np.ndarray, pd.Index]:
+    """
+    Map a key column to integer codes.
+
+    Args:
+        key (pd.Series): The key column.
+
+    Returns:
+        Tuple[np.ndarray, pd.Index]: The code of each row, -1 for missing values, and the
+                                     sorted distinct values the codes refer to.
+    """
+    if isinstance(key.dtype, pd.CategoricalDtype):
+        # Categoricals already carry their codes, no hashing needed
+        return key.cat.codes.to_numpy(), key.cat.categories
+    codes, uniques = pd.factorize(key, sort=True)
+    return codes, pd.Index(uniques)
+
+
+def grouped_sums(
+    keys: Sequence[pd.Series],
+    values: pd.DataFrame,
+    mask: Optional[np.ndarray] = None,
+    observed: bool = True,
+) -> pd.DataFrame:
+    """
+    Sum several value columns by a combination of small-cardinality keys with np.bincount.
+
+    Every key is mapped to integer codes, the codes are combined into a single index over
+    the product of the key spaces, and each value column is summed with one bincount.
+    The result matches `values.groupby(keys).sum()`, with integer columns kept as integers.
+
+    Args:
+        keys (Sequence[pd.Series]): The key columns, aligned with `values`. Their names
+                                    name the levels of the result.
+        values (pd.DataFrame): The columns to sum.
+        mask (np.ndarray, optional): Boolean row filter applied before summing.
+        observed (bool): Only return the key combinations present in the data. Otherwise,
+                         every combination of the key values is returned, with zeros.
+
+    Returns:
+        pd.DataFrame: The sums, indexed by the keys in sorted order.
+    """
+    codes: List[np.ndarray] = []
+    levels: List[pd.Index] = []
+    for key in keys:
+        key_codes, key_levels = factorize(key)
+        codes.append(key_codes)
+        levels.append(key_levels)
+
+    # Combine the codes into one index over the product of the key spaces
+    shape = tuple(len(level) for level in levels)
+    size = int(np.prod(shape))
+    combined = codes[0].astype(np.intp)
+    for key_codes, key_size in zip(codes[1:], shape[1:]):
+        combined *= key_size
+        combined += key_codes
+
+    # Rows with a missing key are dropped, as groupby does
+    rows = np.logical_and.reduce([key_codes >= 0 for key_codes in codes])
+    if mask is not None:
+        rows &= np.asarray(mask, dtype=bool)
+    if not rows.all():
+        combined = combined[rows]
+    else:
+        rows = slice(None)
+
+    sums = {}
+    for column in values.columns:
+        column_values = values[column].to_numpy()
+        totals = np.bincount(
+            combined, weights=column_values[rows].astype("float64"), minlength=size
+        )
+        # Cast explicitly, bincount returns integers when there are no rows
+        if np.issubdtype(column_values.dtype, np.integer):
+            sums[column] = totals.astype("int64")
+        else:
+            sums[column] = totals.astype("float64")
+
+    if len(levels) == 1:
+        index = levels[0].rename(keys[0].name)
+    else:
+        index = pd.MultiIndex.from_product(levels, names=[key.name for key in keys])
+    result = pd.DataFrame(sums, index=index)
+
+    if observed:
+        result = result[np.bincount(combined, minlength=size) > 0]
+    return result
+
+
+def _benchmark(num_rows: int = 2_000_000, repeat: int = 5):
+    from prueba_acceso import generar_shard_ventas
+
+    num_days, num_products = 1500, 20
+    sales_df = generar_shard_ventas(
+        pd.Timestamp("2020-01-01"),
+        num_dias=num_days,
+        num_productos=num_products,
+        num_regiones=8,
+        lineas_por_dia=(1, num_rows // (num_days * num_products)),
+        semilla=np.random.SeedSequence(0),
+    ).fillna(0)
+    sales_df[KEY_COLUMNS] = sales_df[KEY_COLUMNS].astype(object)
+    encoded_df = encode_keys(sales_df)
+    month = sales_df["Fecha"].dt.to_period("M").rename("Month")
+
+    cases = {
+        "Región": (
+            lambda: sales_df.groupby("Región")[VALUE_COLUMNS].sum(),
+            lambda: grouped_sums([encoded_df["Región"]], encoded_df[VALUE_COLUMNS]),
+        ),
+        "Región x Producto": (
+            lambda: sales_df.groupby(["Región", "Producto"])[VALUE_COLUMNS].sum(),
+            lambda: grouped_sums(
+                [encoded_df["Región"], encoded_df["Producto"]],
+                encoded_df[VALUE_COLUMNS],
+            ),
+        ),
+        "Month x Producto": (
+            lambda: sales_df.groupby([month, "Producto"])[VALUE_COLUMNS].sum(),
+            lambda: grouped_sums(
+                [month, encoded_df["Producto"]], encoded_df[VALUE_COLUMNS]
+            ),
+        ),
+    }
+
+    print(f"{len(sales_df)} rows, best of {repeat}")
+    for name, (pandas_path, kernel_path) in cases.items():
+        pd.testing.assert_frame_equal(
+            pandas_path(), kernel_path(), check_index_type=False
+        )
+        pandas_time = min(timeit.repeat(pandas_path, number=1, repeat=repeat))
+        kernel_time = min(timeit.repeat(kernel_path, number=1, repeat=repeat))
+        print(
+            f"{name}: pandas {pandas_time * 1000:.1f} ms, "
+            f"bincount {kernel_time * 1000:.1f} ms "
+            f"({pandas_time / kernel_time:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    _benchmark()
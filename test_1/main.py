@@ -1,196 +1,340 @@
-import shimoku_api_python as Shimoku
-
 from dotenv import load_dotenv
 from os import getenv
+import argparse
+import json
+import os
 import pandas as pd
+import time
+from typing import Any, Dict, List, Optional
 
+from fanout import load_boards, timed, publish_boards, format_report
+from kernels import encode_keys
+from payload import payload_report
+from planner import load_spec, explain, execute_plan, execute_fanout, publish
 from prueba_acceso import generar_datos_ventas
-from utils import (
-    calculate_sales_percentage_by_region,
-    calculate_sales_per_month,
-    calculate_sales_by_month,
-    calculate_data_indicators,
-    calculate_sale_by_region_group_by_date,
-    calculate_this_last_week_sales_vs_prediction,
-    calculate_sales_by_day_of_the_week,
-)
+from sales_store import SalesStore, is_store
+from sampling import StratifiedSample, draw_preview_sample
 
 # Load environment variables
 load_dotenv()
 
-# Generate dummmy sales data
-sales_df = generar_datos_ventas(1000)
-sales_df = sales_df.fillna(0)
-
-# Initiate Shimoku API
-access_token = getenv("SHIMOKU_TOKEN")
-universe_id: str = getenv("UNIVERSE_ID")
-workspace_id: str = getenv("WORKSPACE_ID")
-
-s = Shimoku.Client(
-    access_token=access_token,
-    universe_id=universe_id,
-)
-s.set_workspace(uuid=workspace_id)
-s.set_board("Rodrigo Torres")
-
-# Guided Tasks
-
-# Task 1.a
-sales_by_day_of_the_week = calculate_sales_by_day_of_the_week(sales_df.copy())
-
-# Task 1.b
-data_indicators = calculate_data_indicators(sales_df.copy())
-
-# Task 2
-sales_per_region_percentage = calculate_sales_percentage_by_region(sales_df.copy())
-
-# Task 3
-sales_per_month_agrupation = calculate_sales_by_month(sales_df.copy())
-
-# Task 4
-sales_per_month = calculate_sales_per_month(sales_df.copy())
-
-# Plots
-
-# Task 1
-s.set_menu_path("Prueba-v1", "Weekly Sales Performance 1")
-
-# Task 1.a
-s.plt.line(
-    data=sales_by_day_of_the_week["days_data"],
-    x="Day_of_Week",
-    x_axis_name="Day of the week",
-    y_axis_name="Total Sales ($)",
-    title="Sales Performance: This Week vs. Last Week",
-    order=0,
-    padding="0,1,0,1",
-)
-
-# Task 1.b
-s.plt.indicator(
-    data=data_indicators,
-    order=1,
-    rows_size=1,
-    cols_size=12,
-)
-
-# Task 2
-s.set_menu_path("Prueba-v1", "Regional Sales Distribution")
-s.plt.pie(
-    data=sales_per_region_percentage,
-    names="Región",
-    values="Percentage",
-    order=0,
-    title="Percentage of Sales by Region",
-    rows_size=2,
-    cols_size=12,
-    padding="0,1,0,1",
-)
-
-
-# Task 3
-s.set_menu_path("Prueba-v1", "Monthly Sales Overview")
-s.plt.predictive_line(
-    data=sales_per_month_agrupation["data"],
-    x="Fecha",
-    order=0,
-    min_value_mark=len(sales_per_month_agrupation["data"]),
-    max_value_mark=len(sales_per_month_agrupation["data"])
-    - sales_per_month_agrupation["num_predictions"],
-    rows_size=3,
-    cols_size=12,
-    title="Total Monthly Sales of all products",
-    option_modifications={"dataZoom": {"show": True}, "toolbox": {"show": True}},
-    y_axis_name="Sales ($)",
-)
-
-# Task 4
-s.set_menu_path("Prueba-v1", "Monthly Sales")
-s.plt.stacked_bar(
-    data=sales_per_month,
-    x="Month",
-    y=sales_per_month.columns[1:].tolist(),
-    x_axis_name="Month of the Year",
-    y_axis_name="Total Sales ($)",
-    title="Monthly sales of all products",
-    order=1,
-)
-
-# Non guided tasks
-data = calculate_sale_by_region_group_by_date(sales_df.copy())
-this_last_week_sales_vs_prediction = calculate_this_last_week_sales_vs_prediction(
-    sales_df.copy()
-)
-sales_date_float = this_last_week_sales_vs_prediction["Región 1"]["This week"]["Ventas"]
-prediction_date_float = this_last_week_sales_vs_prediction["Región 1"]["This week"][
-    "Percentage"
-]
-this_week_start_date = this_last_week_sales_vs_prediction["Start Date"].strftime(
-    "%d/%m/%Y"
-)
-this_week_end_date = this_last_week_sales_vs_prediction["End Date"].strftime("%d/%m/%Y")
-last_week_start_date = this_last_week_sales_vs_prediction[
-    "Start Date Last Week"
-].strftime("%d/%m/%Y")
-last_week_end_date = this_last_week_sales_vs_prediction["End Date Last Week"].strftime(
-    "%d/%m/%Y"
-)
-
-# Create a list of region names
-regions = list(this_last_week_sales_vs_prediction.keys())
-
-# Remove non region names and sort by alphabetical order
-regions.remove("Start Date")
-regions.remove("End Date")
-regions.remove("Start Date Last Week")
-regions.remove("End Date Last Week")
-regions.sort()
-
-s.set_menu_path("Prueba-v1", "Filter by Region")
-# Loop through each region
-for region_name in regions:
-    # Set menu path and tabs index
-    s.plt.set_tabs_index(("Tabs", region_name), order=0)
-
-    # Get percentage values
-    this_week_percentage = this_last_week_sales_vs_prediction[region_name]["This week"][
-        "Percentage"
-    ]
-    last_week_percentage = this_last_week_sales_vs_prediction[region_name]["Last week"][
-        "Percentage"
-    ]
-
-    # Plot gauge indicators
-    s.plt.gauge_indicator(
-        value=last_week_percentage,
-        order=0,
-        rows_size=1,
-        cols_size=6,
-        title="Last week: Sales vs Prediction",
-        description=f"Sales from {last_week_start_date} to {last_week_end_date}",
-        color="success" if last_week_percentage >= 100 else "error",
+# The board, the datasets with the `calculate_*` function that feeds each of them, and
+# the layout of menu paths, tabs and charts
+DASHBOARD = load_spec(getenv("DASHBOARD_SPEC", "dashboard.json"))
+
+# SHIMOKU_FAKE publishes to a local client that records the calls, see fake_shimoku.py
+if getenv("SHIMOKU_FAKE"):
+    import fake_shimoku as Shimoku
+else:
+    import shimoku_api_python as Shimoku
+
+
+def preview_args() -> Optional[Dict[str, Optional[float]]]:
+    """
+    Read the preview mode settings from the environment.
+
+    Preview mode: set a sample fraction or a target relative error to publish approximate
+    charts from a stratified sample. Leave both unset, or empty, to publish the exact
+    results.
+
+    Returns:
+        dict: The arguments of `draw_preview_sample`, or None when the preview mode is
+              off.
+
+    Raises:
+        ValueError: If a setting is not a number in (0, 1].
+    """
+    settings = {}
+    for argument, variable in (
+        ("fraction", "PREVIEW_SAMPLE_FRACTION"),
+        ("target_relative_error", "PREVIEW_TARGET_ERROR"),
+    ):
+        value = (getenv(variable) or "").strip()
+        if not value:
+            settings[argument] = None
+            continue
+        try:
+            settings[argument] = float(value)
+        except ValueError:
+            raise ValueError(f"{variable} must be a number, got {value!r}") from None
+        if not 0 < settings[argument] <= 1:
+            raise ValueError(f"{variable} must be in (0, 1], got {value}")
+    if all(value is None for value in settings.values()):
+        return None
+    return settings
+
+
+def build_client(board: str = DASHBOARD["board"]) -> Any:
+    """
+    Initiate the Shimoku API client and select the workspace and board.
+
+    Args:
+        board (str): The board to plot on.
+
+    Returns:
+        Shimoku.Client: The client, ready to plot.
+    """
+    access_token = getenv("SHIMOKU_TOKEN")
+    universe_id: str = getenv("UNIVERSE_ID")
+    workspace_id: str = getenv("WORKSPACE_ID")
+
+    s = Shimoku.Client(
+        access_token=access_token,
+        universe_id=universe_id,
+    )
+    s.set_workspace(uuid=workspace_id)
+    s.set_board(board)
+    return s
+
+
+def load_sales_data(path: Optional[str] = None) -> pd.DataFrame:
+    """
+    Load the sales data, or generate dummy data when no path is given.
+
+    Args:
+        path (str, optional): A CSV file, a Parquet file, a directory of Parquet files,
+                              such as the output of `prueba_acceso.py`, or a
+                              `SalesStore`.
+
+    Returns:
+        pd.DataFrame: The sales data, with missing values set to 0 and the product and
+                      region keys factorized.
+    """
+    if path is None:
+        # Generate dummmy sales data
+        sales_df = generar_datos_ventas(1000)
+    elif is_store(path):
+        sales_df = SalesStore(path).read()
+    elif path.endswith(".csv"):
+        sales_df = pd.read_csv(path, parse_dates=["Fecha"])
+    elif os.path.isdir(path) or path.endswith(".parquet"):
+        sales_df = pd.read_parquet(path)
+    else:
+        raise ValueError(f"Unsupported sales data file: {path}")
+    sales_df = sales_df.fillna(0)
+
+    # Factorize the product and region keys once for every aggregation
+    return encode_keys(sales_df)
+
+
+def load_window_data(path: Optional[str] = None) -> Optional[pd.DataFrame]:
+    """
+    Read only the rows of last week and this week when the sales data is a `SalesStore`.
+
+    Args:
+        path (str, optional): The sales data path, as given to `load_sales_data`.
+
+    Returns:
+        pd.DataFrame: The rows of the window, prepared as in `load_sales_data`, or None
+                      when the data is not a store.
+    """
+    if not is_store(path):
+        return None
+    return encode_keys(SalesStore(path).read_window().fillna(0))
+
+
+def load_preview_sample(sales_df: pd.DataFrame) -> Optional[StratifiedSample]:
+    """
+    Draw the sample of the approximate charts when the preview mode is on.
+
+    The sample only depends on the sales data, so it is drawn once per version of the
+    data and shared by every approximate chart, board and refresh.
+
+    Args:
+        sales_df (pd.DataFrame): The sales data, as returned by `load_sales_data`.
+
+    Returns:
+        StratifiedSample: The sample, or None when the preview mode is off.
+    """
+    sample_args = preview_args()
+    if sample_args is None:
+        return None
+    return draw_preview_sample(sales_df, **sample_args)
+
+
+def preview_plan_args(sample: Optional[StratifiedSample]) -> Dict[str, Any]:
+    """
+    Turn the preview sample into the planner arguments of the preview mode.
+
+    Args:
+        sample (StratifiedSample, optional): The sample, as returned by
+                                             `load_preview_sample`.
+
+    Returns:
+        dict: The 'preview' and 'prepared' arguments of `execute_plan`, empty when there
+              is no sample.
+    """
+    if sample is None:
+        return {}
+    return {"preview": {}, "prepared": {draw_preview_sample: sample}}
+
+
+def compute_datasets(
+    sales_df: pd.DataFrame,
+    window_df: Optional[pd.DataFrame] = None,
+    sample: Optional[StratifiedSample] = None,
+) -> Dict[str, Any]:
+    """
+    Calculate the data of every chart of the board, with the minimal set of scans.
+
+    Args:
+        sales_df (pd.DataFrame): The sales data, as returned by `load_sales_data`.
+        window_df (pd.DataFrame, optional): The rows of last week and this week, as
+                                            returned by `load_window_data`. The charts of
+                                            this week and last week are calculated from
+                                            it instead of the whole history when given.
+        sample (StratifiedSample, optional): The preview sample, as returned by
+                                             `load_preview_sample`. The charts with a
+                                             preview are estimated from it when given.
+
+    Returns:
+        dict: The data of each dataset of the spec, by name. The data of the charts is
+              kept columnar, as `ChartData`, until it is published.
+    """
+    return execute_plan(DASHBOARD, sales_df, window_df, **preview_plan_args(sample))
+
+
+def region_names(datasets: Dict[str, Any]) -> list:
+    """
+    List the regions of the weekly comparison, in alphabetical order.
+
+    Args:
+        datasets (dict): The data of each chart, as returned by `compute_datasets`.
+
+    Returns:
+        list: The region names.
+    """
+    return sorted(datasets["sales_vs_prediction_gauges"])
+
+
+def publish_datasets(s: Any, datasets: Dict[str, Any]):
+    """
+    Plot every chart of the board, as laid out in the spec.
+
+    Args:
+        s (Shimoku.Client): The client, as returned by `build_client`.
+        datasets (dict): The data of each chart, as returned by `compute_datasets`.
+    """
+    publish(DASHBOARD, datasets, s)
+
+
+def report_payloads(datasets: Dict[str, Any]):
+    """
+    Print the encoded size of each chart payload.
+
+    Args:
+        datasets (dict): The data of each chart, as returned by `compute_datasets`.
+    """
+    payloads = {
+        "Sales by day of the week": datasets["sales_by_day_of_the_week"]["days_data"],
+        "Indicators": datasets["data_indicators"],
+        "Sales by region": datasets["sales_per_region_percentage"],
+        "Monthly sales": datasets["sales_per_month_agrupation"]["data"],
+        "Sales per month": datasets["sales_per_month"],
+        "Ticket size quantiles": datasets["ticket_quantiles"],
+        "Daily sales quantiles": datasets["daily_sales_quantiles"],
+    }
+    payloads.update(
+        {
+            f"Weekly sales {region}": datasets["weekly_sales_by_region"][region]
+            for region in region_names(datasets)
+        }
     )
+    for chart_report in payload_report(payloads):
+        print(
+            f"{chart_report['chart']}: {chart_report['rows']} rows, "
+            f"{chart_report['encoded_bytes']} bytes "
+            f"({chart_report['content_encoding'] or 'identity'}, "
+            f"{chart_report['raw_bytes']} bytes raw)"
+        )
+
+
+def publish_fanout(
+    sales_df: pd.DataFrame,
+    boards: Dict[str, List[str]],
+    window_df: Optional[pd.DataFrame] = None,
+    sample: Optional[StratifiedSample] = None,
+) -> str:
+    """
+    Publish the board once per sales rep, each showing only some regions.
+
+    Every scan of the plan is also grouped by region and run once, the datasets of every
+    board are calculated from the scanned rows of its regions, and the boards are
+    published concurrently.
 
-    s.plt.gauge_indicator(
-        value=this_week_percentage,
-        order=2,
-        rows_size=1,
-        cols_size=6,
-        title="This week: Sales vs Prediction",
-        description=f"Sales from {this_week_start_date} to {this_week_end_date}",
-        color="success" if this_week_percentage >= 100 else "error",
+    Args:
+        sales_df (pd.DataFrame): The sales data, as returned by `load_sales_data`.
+        boards (dict): The regions shown on each board, by board name.
+        window_df (pd.DataFrame, optional): The rows of last week and this week, as
+                                            returned by `load_window_data`.
+        sample (StratifiedSample, optional): The preview sample, as returned by
+                                             `load_preview_sample`. Each board reads the
+                                             strata of its regions.
+
+    Returns:
+        str: The timing report of the fan-out.
+    """
+    start = time.perf_counter()
+    board_datasets = execute_fanout(
+        DASHBOARD, sales_df, boards, window_df=window_df, **preview_plan_args(sample)
     )
+    compute_seconds = time.perf_counter() - start
+
+    def publish_board(board: str, regions: List[str], timings: Dict[str, float]):
+        with timed(timings, "connect"):
+            s = build_client(board)
+        with timed(timings, "publish"):
+            publish_datasets(s, board_datasets[board])
+
+    return format_report(publish_boards(boards, publish_board), compute_seconds)
 
-    # Plot stacked bar chart
-    s.plt.stacked_bar(
-        x="date",
-        order=6,
-        title="Total Weekly Sales by Product (USD)",
-        data=data[region_name],
-        option_modifications={"dataZoom": {"show": True}, "toolbox": {"show": True}},
-        y_axis_name="Sales ($)",
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Publish the sales dashboard to Shimoku."
+    )
+    parser.add_argument(
+        "--spec",
+        default=getenv("DASHBOARD_SPEC", "dashboard.json"),
+        help="Dashboard spec, JSON or YAML",
+    )
+    parser.add_argument(
+        "--explain", action="store_true", help="Print the fused plan and exit"
+    )
+    parser.add_argument(
+        "--report-payloads",
+        action="store_true",
+        default=bool(getenv("REPORT_PAYLOADS")),
+        help="Print the encoded size of each chart payload after publishing",
     )
+    args = parser.parse_args()
+
+    DASHBOARD = load_spec(args.spec)
+    if args.explain:
+        print(explain(DASHBOARD, {} if preview_args() is not None else None))
+        raise SystemExit(0)
+
+    sales_data_path = getenv("SALES_DATA_PATH")
+    sales_df = load_sales_data(sales_data_path)
+    sample = load_preview_sample(sales_df)
+
+    # Fan-out mode: one board per entry of the BOARDS_FILE mapping
+    boards_path = getenv("BOARDS_FILE")
+    if boards_path:
+        print(
+            publish_fanout(
+                sales_df,
+                load_boards(boards_path),
+                load_window_data(sales_data_path),
+                sample,
+            )
+        )
+        raise SystemExit(0)
 
-# Pop out of tabs group
-s.plt.pop_out_of_tabs_group()
+    s = build_client(DASHBOARD["board"])
+    datasets = compute_datasets(sales_df, load_window_data(sales_data_path), sample)
+    publish_datasets(s, datasets)
+    if args.report_payloads:
+        report_payloads(datasets)
+    if getenv("SHIMOKU_FAKE"):
+        print(json.dumps(s.summary(), indent=2))
@@ -0,0 +1,405 @@
+import pandas as pd
+
+import json
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from aggregations import AGGREGATIONS, DERIVED_VALUES, SCAN_VALUES
+from payload import to_records
+
+# Time grains from finest to coarsest, as pandas period aliases
+GRAINS = ["D", "W", "M"]
+
+
+class Scan(NamedTuple):
+    filter: Optional[str]
+    grain: Optional[str]
+    columns: Tuple[str, ...]
+    datasets: Tuple[str, ...]
+    window: bool = False
+
+
+def load_spec(path: str) -> dict:
+    """
+    Load a dashboard spec from a JSON or YAML file.
+
+    Parameters:
+        path (str): Path of the spec. Files ending in '.yaml' or '.yml' need PyYAML.
+
+    Returns:
+        dict: The dashboard spec.
+    """
+    with open(path, encoding="utf-8") as spec_file:
+        if path.endswith((".yaml", ".yml")):
+            try:
+                import yaml
+            except ImportError as error:
+                raise ImportError("PyYAML is required to load YAML specs") from error
+            return yaml.safe_load(spec_file)
+        return json.load(spec_file)
+
+
+def select_datasets(spec: dict, preview: Optional[dict] = None) -> Dict[str, dict]:
+    """
+    Pick the function that computes each dataset of a spec.
+
+    Parameters:
+        spec (dict): The dashboard spec.
+        preview (dict, optional): Arguments of the preview mode. When given, the datasets
+                                  with a 'preview' entry are computed by its function,
+                                  with these arguments added to its own.
+
+    Returns:
+        dict: The datasets, by name, each with its 'function' and 'args'.
+    """
+    datasets = spec["datasets"]
+    if preview is None:
+        return datasets
+    return {
+        name: (
+            {
+                "function": dataset["preview"]["function"],
+                "args": {**dataset["preview"].get("args", {}), **preview},
+            }
+            if "preview" in dataset
+            else dataset
+        )
+        for name, dataset in datasets.items()
+    }
+
+
+def plan_scans(datasets: Dict[str, dict]) -> List[Scan]:
+    """
+    Fuse the aggregations required by the datasets of a spec into the minimal set of scans.
+
+    Datasets with the same function and arguments are computed once. Every aggregation with
+    the same row filter is served by one scan, grouped by the union of their columns at the
+    finest of their time grains. The aggregations that need the rows themselves, and the
+    ones that only look at the window of last week and this week, get scans of their own.
+
+    Parameters:
+        datasets (dict): The 'datasets' section of the spec.
+
+    Returns:
+        list: The scans, in the order their filters first appear in the spec.
+    """
+    scans: Dict[Tuple[Optional[str], bool, bool], dict] = {}
+    for name, dataset in datasets.items():
+        aggregation = AGGREGATIONS[dataset["function"]]
+        scan = scans.setdefault(
+            (aggregation.filter, aggregation.grain is None, aggregation.window),
+            {"grain": aggregation.grain, "columns": [], "datasets": []},
+        )
+        if aggregation.grain is not None:
+            if GRAINS.index(aggregation.grain) < GRAINS.index(scan["grain"]):
+                scan["grain"] = aggregation.grain
+            for column in aggregation.columns(dataset.get("args", {})):
+                if column not in scan["columns"]:
+                    scan["columns"].append(column)
+        scan["datasets"].append(name)
+
+    return [
+        Scan(
+            row_filter,
+            scan["grain"],
+            tuple(scan["columns"]),
+            tuple(scan["datasets"]),
+            window,
+        )
+        for (row_filter, _, window), scan in scans.items()
+    ]
+
+
+def _dataset_key(dataset: dict) -> str:
+    return json.dumps(
+        [dataset["function"], dataset.get("args", {})], sort_keys=True, default=str
+    )
+
+
+def explain(spec: dict, preview: Optional[dict] = None) -> str:
+    """
+    Describe the fused plan of a spec.
+
+    Parameters:
+        spec (dict): The dashboard spec.
+        preview (dict, optional): Arguments of the preview mode, see `select_datasets`.
+
+    Returns:
+        str: One block per scan with the datasets it feeds.
+    """
+    datasets = select_datasets(spec, preview)
+    lines = []
+    computed = {}
+    for position, scan in enumerate(plan_scans(datasets), start=1):
+        rows = "window rows" if scan.window else "rows"
+        if scan.grain is None:
+            grouping = "no grouping"
+        else:
+            grouping = (
+                f"group by {', '.join(('Fecha[' + scan.grain + ']',) + scan.columns)}, "
+                f"sum {', '.join(SCAN_VALUES)}"
+            )
+        lines.append(
+            f"Scan {position}: {rows}, filter {scan.filter or 'none'}, {grouping}"
+        )
+        for name in scan.datasets:
+            dataset = datasets[name]
+            key = _dataset_key(dataset)
+            prepare = AGGREGATIONS[dataset["function"]].prepare
+            via = f" via {prepare.__name__}" if prepare else ""
+            reused = f" (reuses {computed[key]})" if key in computed else ""
+            computed.setdefault(key, name)
+            lines.append(f"  -> {name}: {dataset['function']}{via}{reused}")
+    return "\n".join(lines)
+
+
+def run_scan(df: pd.DataFrame, scan: Scan) -> pd.DataFrame:
+    """
+    Filter and sum the sales data once for every dataset of a scan.
+
+    Parameters:
+        df (pd.DataFrame): The sales data.
+        scan (Scan): The scan to run.
+
+    Returns:
+        pd.DataFrame: One row per group with 'Fecha', the scan columns and the
+                      `SCAN_VALUES`. 'Fecha' is the first day of each period. The
+                      filtered rows, unchanged, when the scan has no grain.
+    """
+    frame = df.query(scan.filter) if scan.filter else df
+    if scan.grain is None:
+        return frame
+    frame = frame.assign(
+        **{name: derive(frame) for name, derive in DERIVED_VALUES.items()}
+    )
+    fecha = pd.to_datetime(frame["Fecha"])
+    if scan.grain == "D":
+        period = fecha.dt.normalize()
+    else:
+        period = fecha.dt.to_period(scan.grain).dt.start_time
+    return (
+        frame.groupby([period.rename("Fecha"), *scan.columns], observed=True)[
+            SCAN_VALUES
+        ]
+        .sum()
+        .reset_index()
+    )
+
+
+def execute_plan(
+    spec: dict,
+    df: pd.DataFrame,
+    window_df: Optional[pd.DataFrame] = None,
+    preview: Optional[dict] = None,
+    prepared: Optional[Dict[Any, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Run the fused plan of a spec and compute every dataset.
+
+    Parameters:
+        spec (dict): The dashboard spec.
+        df (pd.DataFrame): The sales data.
+        window_df (pd.DataFrame, optional): The rows of last week and this week, loaded on
+                                            their own. The window scans read `df` when
+                                            not given.
+        preview (dict, optional): Arguments of the preview mode, see `select_datasets`.
+        prepared (dict, optional): Results of the `prepare` functions of the datasets
+                                   that need the rows, by function, already computed
+                                   from `df`, e.g. kept across refreshes of the same data.
+
+    Returns:
+        dict: The result of each dataset, by name, as `ChartData` when the function
+              supports it.
+    """
+    datasets = select_datasets(spec, preview)
+    results = {}
+    for scan in plan_scans(datasets):
+        rows = window_df if scan.window and window_df is not None else df
+        results.update(
+            _compute_scan_datasets(
+                scan,
+                run_scan(rows, scan),
+                datasets,
+                prepared if scan.grain is None else None,
+            )
+        )
+    return results
+
+
+def _compute_scan_datasets(
+    scan: Scan,
+    scanned: pd.DataFrame,
+    datasets: Dict[str, dict],
+    prepared: Optional[Dict[Any, Any]] = None,
+) -> Dict[str, Any]:
+    results = {}
+    computed = {}
+    prepared = dict(prepared or {})
+    for name in scan.datasets:
+        dataset = datasets[name]
+        key = _dataset_key(dataset)
+        if key not in computed:
+            aggregation = AGGREGATIONS[dataset["function"]]
+            if aggregation.prepare is None:
+                data = scanned.copy()
+            else:
+                if aggregation.prepare not in prepared:
+                    prepared[aggregation.prepare] = aggregation.prepare(scanned)
+                data = prepared[aggregation.prepare]
+            args = dataset.get("args", {})
+            if aggregation.columnar:
+                # Results stay columnar until they are published
+                args = {"columnar": True, **args}
+            computed[key] = aggregation.function(data, **args)
+        results[name] = computed[key]
+    return results
+
+
+def _board_rows(frame: pd.DataFrame, by: str, regions: List[str]) -> pd.DataFrame:
+    rows = frame[frame[by].isin(regions)]
+    if isinstance(rows[by].dtype, pd.CategoricalDtype):
+        # As if the data of the board had been loaded on its own
+        rows = rows.assign(**{by: rows[by].cat.remove_unused_categories()})
+    return rows
+
+
+def execute_fanout(
+    spec: dict,
+    df: pd.DataFrame,
+    boards: Dict[str, List[str]],
+    by: str = "Región",
+    window_df: Optional[pd.DataFrame] = None,
+    preview: Optional[dict] = None,
+    prepared: Optional[Dict[Any, Any]] = None,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Run the fused plan of a spec once for several boards, each showing some regions.
+
+    Every scan is also grouped by region and run once over the whole data. The datasets
+    of each board are then computed from the scanned rows of its regions, which gives
+    the same result as running the plan on the rows of those regions. The datasets that
+    need the rows themselves are computed from the rows of the board's regions, unless
+    their `prepare` result has a `select(regions)` method: it is then computed once over
+    every region and narrowed to the regions of each board.
+
+    Parameters:
+        spec (dict): The dashboard spec.
+        df (pd.DataFrame): The sales data of every region.
+        boards (dict): The regions shown on each board, by board name.
+        by (str): The region column.
+        window_df (pd.DataFrame, optional): The rows of last week and this week, as in
+                                            `execute_plan`.
+        preview (dict, optional): Arguments of the preview mode, see `select_datasets`.
+        prepared (dict, optional): Results of `prepare` functions already computed from
+                                   `df`, as in `execute_plan`. Only the ones with a
+                                   `select(regions)` method are used.
+
+    Returns:
+        dict: The result of each dataset, by name, for each board.
+    """
+    datasets = select_datasets(spec, preview)
+    results: Dict[str, Dict[str, Any]] = {board: {} for board in boards}
+    for scan in plan_scans(datasets):
+        rows = window_df if scan.window and window_df is not None else df
+        if scan.grain is None:
+            scanned = run_scan(rows, scan)
+            shared = dict(prepared or {})
+            for name in scan.datasets:
+                prepare = AGGREGATIONS[datasets[name]["function"]].prepare
+                if prepare is not None and prepare not in shared:
+                    shared[prepare] = prepare(scanned)
+            shared = {
+                prepare: value
+                for prepare, value in shared.items()
+                if hasattr(value, "select")
+            }
+            for board, regions in boards.items():
+                results[board].update(
+                    _compute_scan_datasets(
+                        scan,
+                        _board_rows(scanned, by, regions),
+                        datasets,
+                        {
+                            prepare: value.select(regions)
+                            for prepare, value in shared.items()
+                        },
+                    )
+                )
+            continue
+
+        columns = scan.columns if by in scan.columns else scan.columns + (by,)
+        scanned = run_scan(rows, scan._replace(columns=columns))
+        for board, regions in boards.items():
+            board_scanned = _board_rows(scanned, by, regions)
+            if by not in scan.columns:
+                # Sum the regions of the board back into the groups of the scan
+                board_scanned = (
+                    board_scanned.groupby(["Fecha", *scan.columns], observed=True)[
+                        SCAN_VALUES
+                    ]
+                    .sum()
+                    .reset_index()
+                )
+            results[board].update(_compute_scan_datasets(scan, board_scanned, datasets))
+    return results
+
+
+def _resolve(path: List[Any], results: Dict[str, Any], tab: Optional[str]) -> Any:
+    value = results
+    for key in path:
+        value = value[tab if key == "$tab" else key]
+    return value
+
+
+def _chart_kwargs(step: dict, results: Dict[str, Any], tab: Optional[str] = None):
+    kwargs = {}
+    for key, value in step.items():
+        if key == "chart":
+            continue
+        if key == "data":
+            if isinstance(value, str):
+                # A dataset name, the data of the current tab inside `for_each_tab`
+                value = [value] if tab is None else [value, "$tab"]
+            kwargs["data"] = to_records(_resolve(value, results, tab))
+        elif isinstance(value, dict) and "ref" in value:
+            kwargs[key] = _resolve(value["ref"], results, tab)
+        else:
+            kwargs[key] = value
+    return kwargs
+
+
+def publish(spec: dict, results: Dict[str, Any], client: Any):
+    """
+    Lay out the charts of a spec on a Shimoku client.
+
+    The 'data' of a chart is the name of a dataset, or a key path into it such as
+    ["sales", "$tab", "data"]. Any other argument can take a value from the datasets with
+    {"ref": <key path>}. '$tab' stands for the current tab inside `for_each_tab`.
+
+    Parameters:
+        spec (dict): The dashboard spec.
+        results (dict): The datasets computed by `execute_plan`.
+        client (Any): The Shimoku client, or a wrapper such as `DedupPublisher`.
+    """
+    for step in spec["layout"]:
+        if "menu_path" in step:
+            client.set_menu_path(*step["menu_path"])
+        elif "tabs_index" in step:
+            client.plt.set_tabs_index(
+                tuple(step["tabs_index"]), order=step.get("order")
+            )
+        elif "change_tab" in step:
+            client.plt.change_current_tab(step["change_tab"])
+        elif "pop_out_of_tabs" in step:
+            client.plt.pop_out_of_tabs_group()
+        elif "for_each_tab" in step:
+            # One tab per key of a dataset, the charts use the data of their tab
+            tabs = step["for_each_tab"]
+            for tab in sorted(results[tabs["data"]]):
+                client.plt.set_tabs_index((tabs["group"], tab), order=tabs.get("order"))
+                for chart in step["charts"]:
+                    getattr(client.plt, chart["chart"])(
+                        **_chart_kwargs(chart, results, tab)
+                    )
+            client.plt.pop_out_of_tabs_group()
+        else:
+            getattr(client.plt, step["chart"])(**_chart_kwargs(step, results))
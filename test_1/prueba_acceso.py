@@ -1,6 +1,11 @@
 import pandas as pd
+import numpy as np
 import random
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
 
 
 def generar_datos_ventas(num_registros=1000):
@@ -47,3 +52,244 @@ def generar_datos_ventas(num_registros=1000):
     # Convertir los datos en un DataFrame de Pandas
     df_ventas = pd.DataFrame(ventas)
     return df_ventas
+
+
+def nombres_productos(num_productos: int) -> List[str]:
+    # Mantener los nombres originales ("Producto A", ...) mientras haya letras
+    if num_productos <= 26:
+        return [f"Producto {chr(ord('A') + i)}" for i in range(num_productos)]
+    return [f"Producto {i + 1}" for i in range(num_productos)]
+
+
+def nombres_regiones(num_regiones: int) -> List[str]:
+    return [f"Región {i + 1}" for i in range(num_regiones)]
+
+
+def pesos_sesgados(num_categorias: int, sesgo: float) -> np.ndarray:
+    """
+    Calcular pesos tipo Zipf para un número de categorías.
+
+    Args:
+        num_categorias (int): Número de categorías.
+        sesgo (float): Exponente de Zipf. 0 genera una distribución uniforme.
+
+    Returns:
+        np.ndarray: Pesos normalizados que suman 1.
+    """
+    pesos = 1.0 / np.arange(1, num_categorias + 1) ** sesgo
+    return pesos / pesos.sum()
+
+
+def generar_shard_ventas(
+    fecha_inicio: datetime,
+    num_dias: int,
+    num_productos: int = 4,
+    num_regiones: int = 4,
+    lineas_por_dia: Tuple[int, int] = (1, 5),
+    meses_prediccion: int = 0,
+    sesgo: float = 0.0,
+    semilla: Optional[np.random.SeedSequence] = None,
+) -> pd.DataFrame:
+    """
+    Generar un bloque de ventas ficticias de forma vectorizada.
+
+    Produce la misma estructura que `generar_datos_ventas` para un rango de fechas,
+    pero con un número configurable de productos, regiones y líneas por producto y día.
+
+    Args:
+        fecha_inicio (datetime): Primer día del bloque.
+        num_dias (int): Número de días del bloque.
+        num_productos (int): Número de productos distintos.
+        num_regiones (int): Número de regiones distintas.
+        lineas_por_dia (Tuple[int, int]): Mínimo y máximo de líneas por producto y día.
+        meses_prediccion (int): Meses de predicción a añadir tras el último día del bloque.
+        sesgo (float): Exponente de Zipf aplicado a regiones y al volumen de líneas
+                       de cada producto. 0 genera datos uniformes, con un número de
+                       líneas uniforme en `lineas_por_dia`.
+        semilla (np.random.SeedSequence, optional): Semilla del bloque.
+
+    Returns:
+        pd.DataFrame: DataFrame con las columnas 'Fecha', 'Producto', 'Ventas',
+                      'Región' y 'Prediccion'.
+    """
+    rng = np.random.default_rng(semilla)
+    productos = nombres_productos(num_productos)
+    regiones = nombres_regiones(num_regiones)
+    min_lineas, max_lineas = lineas_por_dia
+
+    if sesgo == 0:
+        # Sin sesgo, un número uniforme de líneas en [mínimo, máximo], como en
+        # `generar_datos_ventas`
+        num_lineas = rng.integers(
+            min_lineas, max_lineas + 1, size=num_dias * num_productos
+        )
+    else:
+        # Con sesgo, los productos más populares tienen más líneas por día. La
+        # probabilidad p = w / (w + media(w)) es 0.5 para un peso medio y nunca llega a 1,
+        # así que ningún producto queda fijo en el máximo.
+        pesos_productos = pesos_sesgados(num_productos, sesgo)
+        prob_lineas = np.tile(
+            pesos_productos / (pesos_productos + pesos_productos.mean()), num_dias
+        )
+        num_lineas = min_lineas + rng.binomial(max_lineas - min_lineas, prob_lineas)
+    total = int(num_lineas.sum())
+
+    dias = np.repeat(np.arange(num_dias), num_productos)
+    codigos_productos = np.tile(np.arange(num_productos), num_dias)
+    fechas = pd.Timestamp(fecha_inicio) + pd.to_timedelta(
+        np.repeat(dias, num_lineas), unit="D"
+    )
+    codigos_regiones = rng.choice(
+        num_regiones, size=total, p=pesos_sesgados(num_regiones, sesgo)
+    )
+
+    df_ventas = pd.DataFrame(
+        {
+            "Fecha": fechas,
+            "Producto": pd.Categorical.from_codes(
+                np.repeat(codigos_productos, num_lineas), productos
+            ),
+            "Ventas": rng.integers(100, 1001, size=total).astype("float64"),
+            "Región": pd.Categorical.from_codes(codigos_regiones, regiones),
+            "Prediccion": rng.integers(50, 901, size=total),
+        }
+    )
+
+    if meses_prediccion:
+        # Una fila por producto y región cada 30 días, sin ventas (NaN)
+        combinaciones = num_productos * num_regiones
+        desplazamientos = 30 * np.repeat(
+            np.arange(1, meses_prediccion + 1), combinaciones
+        )
+        ultima_fecha = pd.Timestamp(fecha_inicio) + pd.Timedelta(days=num_dias - 1)
+        df_prediccion = pd.DataFrame(
+            {
+                "Fecha": ultima_fecha + pd.to_timedelta(desplazamientos, unit="D"),
+                "Producto": pd.Categorical.from_codes(
+                    np.tile(
+                        np.repeat(np.arange(num_productos), num_regiones),
+                        meses_prediccion,
+                    ),
+                    productos,
+                ),
+                "Ventas": np.nan,
+                "Región": pd.Categorical.from_codes(
+                    np.tile(np.arange(num_regiones), num_productos * meses_prediccion),
+                    regiones,
+                ),
+                "Prediccion": rng.integers(50, 901, size=len(desplazamientos)),
+            }
+        )
+        df_ventas = pd.concat([df_ventas, df_prediccion], ignore_index=True)
+
+    return df_ventas
+
+
+def _escribir_shard(argumentos: tuple) -> str:
+    ruta, indice, fecha_inicio, num_dias, parametros, semilla = argumentos
+    df_shard = generar_shard_ventas(
+        fecha_inicio, num_dias, semilla=semilla, **parametros
+    )
+    ruta_shard = os.path.join(ruta, f"part-{indice:05d}.parquet")
+    df_shard.to_parquet(ruta_shard, index=False)
+    return ruta_shard
+
+
+def generar_datos_escala(
+    ruta: str,
+    num_dias: int = 1000,
+    num_productos: int = 4,
+    num_regiones: int = 4,
+    lineas_por_dia: Tuple[int, int] = (1, 5),
+    meses_prediccion: int = 6,
+    sesgo: float = 0.0,
+    dias_por_shard: int = 30,
+    num_procesos: Optional[int] = None,
+    semilla: int = 0,
+) -> List[str]:
+    """
+    Generar un conjunto de ventas ficticias a gran escala en ficheros Parquet.
+
+    El rango de fechas se divide en bloques de `dias_por_shard` días que se generan en
+    paralelo en procesos independientes. Cada bloque recibe su propia semilla derivada
+    de `semilla`, por lo que el resultado es reproducible sin importar el número de procesos.
+
+    Args:
+        ruta (str): Directorio donde se escriben los ficheros 'part-XXXXX.parquet'.
+        num_dias (int): Número de días de histórico hasta hoy.
+        num_productos (int): Número de productos distintos.
+        num_regiones (int): Número de regiones distintas.
+        lineas_por_dia (Tuple[int, int]): Mínimo y máximo de líneas por producto y día.
+        meses_prediccion (int): Meses de predicción añadidos tras el último día.
+        sesgo (float): Exponente de Zipf para regiones y productos.
+        dias_por_shard (int): Días por fichero Parquet.
+        num_procesos (int, optional): Procesos de trabajo. Por defecto, uno por CPU.
+        semilla (int): Semilla raíz del conjunto de datos.
+
+    Returns:
+        list: Rutas de los ficheros generados, en orden cronológico.
+    """
+    os.makedirs(ruta, exist_ok=True)
+
+    fecha_inicial = datetime.now().replace(
+        hour=0, minute=0, second=0, microsecond=0
+    ) - timedelta(days=num_dias)
+    inicios = list(range(0, num_dias, dias_por_shard))
+    semillas = np.random.SeedSequence(semilla).spawn(len(inicios))
+
+    tareas = []
+    for indice, (inicio, semilla_shard) in enumerate(zip(inicios, semillas)):
+        dias_shard = min(dias_por_shard, num_dias - inicio)
+        parametros = {
+            "num_productos": num_productos,
+            "num_regiones": num_regiones,
+            "lineas_por_dia": lineas_por_dia,
+            "sesgo": sesgo,
+            # Sólo el último bloque lleva los meses de predicción
+            "meses_prediccion": meses_prediccion if indice == len(inicios) - 1 else 0,
+        }
+        tareas.append(
+            (
+                ruta,
+                indice,
+                fecha_inicial + timedelta(days=inicio),
+                dias_shard,
+                parametros,
+                semilla_shard,
+            )
+        )
+
+    with ProcessPoolExecutor(max_workers=num_procesos) as executor:
+        return list(executor.map(_escribir_shard, tareas))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Generar ventas ficticias a gran escala en ficheros Parquet."
+    )
+    parser.add_argument("ruta", help="Directorio de salida")
+    parser.add_argument("--dias", type=int, default=1000)
+    parser.add_argument("--productos", type=int, default=4)
+    parser.add_argument("--regiones", type=int, default=4)
+    parser.add_argument("--min-lineas", type=int, default=1)
+    parser.add_argument("--max-lineas", type=int, default=5)
+    parser.add_argument("--meses-prediccion", type=int, default=6)
+    parser.add_argument("--sesgo", type=float, default=0.0)
+    parser.add_argument("--dias-por-shard", type=int, default=30)
+    parser.add_argument("--procesos", type=int, default=None)
+    parser.add_argument("--semilla", type=int, default=0)
+    args = parser.parse_args()
+
+    rutas = generar_datos_escala(
+        args.ruta,
+        num_dias=args.dias,
+        num_productos=args.productos,
+        num_regiones=args.regiones,
+        lineas_por_dia=(args.min_lineas, args.max_lineas),
+        meses_prediccion=args.meses_prediccion,
+        sesgo=args.sesgo,
+        dias_por_shard=args.dias_por_shard,
+        num_procesos=args.procesos,
+        semilla=args.semilla,
+    )
+    print(f"{len(rutas)} ficheros generados en {args.ruta}")
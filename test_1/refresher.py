@@ -0,0 +1,282 @@
+import argparse
+import datetime
+import json
+import os
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+
+from main import (
+    build_client,
+    load_sales_data,
+    load_window_data,
+    load_preview_sample,
+    compute_datasets,
+    publish_datasets,
+)
+
+
+class Refresher:
+    """
+    Resident process that keeps the Shimoku client, the sales data and the chart data warm
+    between dashboard refreshes.
+
+    Every refresh runs four stages, skipping the ones whose inputs did not change:
+
+    - connect: build the client and select the workspace and board, only once, or again
+      after a failed refresh.
+    - load: read the sales data, and draw the preview sample in preview mode, only when
+      the input file changed.
+    - compute: calculate the chart data, only when the data or the current date changed,
+      since the weekly charts are relative to today.
+    - publish: plot every chart.
+
+    The timings of the last refresh are kept in `status` and written to a JSON file.
+    """
+
+    def __init__(
+        self,
+        data_path: Optional[str] = None,
+        interval: float = 300.0,
+        status_path: Optional[str] = "refresher_status.json",
+    ):
+        self.data_path = data_path
+        self.interval = interval
+        self.status_path = status_path
+
+        self.client: Any = None
+        self.sales_df = None
+        self.sample = None
+        self.datasets: Optional[Dict[str, Any]] = None
+        self._data_version: Optional[int] = None
+        self._computed_for: Optional[tuple] = None
+        self._lock = threading.Lock()
+
+        self.status: Dict[str, Any] = {
+            "pid": os.getpid(),
+            "data_path": data_path,
+            "interval_seconds": interval,
+            "state": "starting",
+            "refreshes": 0,
+            "failures": 0,
+            "last_refresh": None,
+            "next_refresh_at": None,
+        }
+
+    def input_version(self) -> Optional[int]:
+        """
+        Identify the current version of the input file by its modification time.
+
+        Returns:
+            int: The latest modification time in nanoseconds, of the file or of any file
+                 in the directory. None when the data is generated or the file is missing.
+        """
+        if self.data_path is None or not os.path.exists(self.data_path):
+            return None
+        if os.path.isdir(self.data_path):
+            return max(
+                [os.stat(self.data_path).st_mtime_ns]
+                + [entry.stat().st_mtime_ns for entry in os.scandir(self.data_path)]
+            )
+        return os.stat(self.data_path).st_mtime_ns
+
+    @contextmanager
+    def _stage(self, timings: Dict[str, float], name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            timings[name] = round(time.perf_counter() - start, 6)
+
+    def refresh(self, trigger: str = "manual") -> Dict[str, Any]:
+        """
+        Refresh the dashboard, reusing the warm state of the previous refresh.
+
+        Args:
+            trigger (str): What triggered the refresh, recorded in the status.
+
+        Returns:
+            dict: The report of the refresh: trigger, start and end times, latency and
+                  the timings of the stages that ran, the reused stages and the error if
+                  it failed.
+        """
+        with self._lock:
+            self._set_status(state="refreshing")
+            timings: Dict[str, float] = {}
+            reused = []
+            report = {
+                "trigger": trigger,
+                "started_at": datetime.datetime.now().isoformat(timespec="seconds"),
+            }
+            start = time.perf_counter()
+            try:
+                if self.client is None:
+                    with self._stage(timings, "connect"):
+                        self.client = build_client()
+                else:
+                    reused.append("connect")
+
+                version = self.input_version()
+                if self.sales_df is None or version != self._data_version:
+                    with self._stage(timings, "load"):
+                        self.sales_df = load_sales_data(self.data_path)
+                        self.sample = load_preview_sample(self.sales_df)
+                    self._data_version = version
+                else:
+                    reused.append("load")
+
+                computed_for = (self._data_version, datetime.date.today())
+                if self.datasets is None or computed_for != self._computed_for:
+                    with self._stage(timings, "compute"):
+                        self.datasets = compute_datasets(
+                            self.sales_df,
+                            load_window_data(self.data_path),
+                            self.sample,
+                        )
+                    self._computed_for = computed_for
+                else:
+                    reused.append("compute")
+
+                with self._stage(timings, "publish"):
+                    publish_datasets(self.client, self.datasets)
+                report["error"] = None
+            except Exception:
+                # Start from a fresh session next time, the client may be in a bad state
+                self.client = None
+                report["error"] = traceback.format_exc()
+                self.status["failures"] += 1
+
+            report["finished_at"] = datetime.datetime.now().isoformat(
+                timespec="seconds"
+            )
+            report["latency_seconds"] = round(time.perf_counter() - start, 6)
+            report["stage_seconds"] = timings
+            report["reused_stages"] = reused
+            self.status["refreshes"] += 1
+            self._set_status(state="idle", last_refresh=report)
+            return report
+
+    def _set_status(self, **changes):
+        # Called with self._lock held, a concurrent refresh would interleave the writes
+        self.status.update(changes)
+        if self.status_path is None:
+            return
+        # Write to a temporary file first, readers never see a partial status
+        temporary_path = f"{self.status_path}.tmp"
+        with open(temporary_path, "w", encoding="utf-8") as status_file:
+            json.dump(self.status, status_file, indent=2)
+        os.replace(temporary_path, self.status_path)
+
+    def run(self, poll_seconds: float = 1.0):
+        """
+        Refresh on the schedule and whenever the input file changes, until interrupted.
+
+        Args:
+            poll_seconds (float): How often to check the schedule and the input file.
+        """
+        next_refresh = time.monotonic()
+        seen_version = self.input_version()
+        while True:
+            trigger = None
+            if time.monotonic() >= next_refresh:
+                trigger = "schedule"
+            elif self.input_version() != seen_version:
+                trigger = "input changed"
+
+            if trigger is not None:
+                # A failed load is retried on the schedule, not on every poll
+                seen_version = self.input_version()
+                report = self.refresh(trigger)
+                next_refresh = time.monotonic() + self.interval
+                with self._lock:
+                    self._set_status(
+                        next_refresh_at=(
+                            datetime.datetime.now()
+                            + datetime.timedelta(seconds=self.interval)
+                        ).isoformat(timespec="seconds")
+                    )
+                outcome = "failed" if report["error"] else "done"
+                print(
+                    f"Refresh {outcome} ({trigger}) in "
+                    f"{report['latency_seconds']:.3f} s: {report['stage_seconds']}"
+                )
+            time.sleep(poll_seconds)
+
+
+def serve_status(refresher: Refresher, port: int, host: str = "127.0.0.1"):
+    """
+    Serve the status of a refresher as JSON over HTTP from a background thread.
+
+    GET /status returns the status and POST /refresh triggers a refresh and returns its
+    report.
+
+    Args:
+        refresher (Refresher): The refresher to report on.
+        port (int): The local port to listen on.
+        host (str): The address to bind, local only by default.
+
+    Returns:
+        ThreadingHTTPServer: The running server.
+    """
+
+    class StatusHandler(BaseHTTPRequestHandler):
+        def _send_json(self, code: int, content: Any):
+            body = json.dumps(content, indent=2).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path.rstrip("/") in ("", "/status"):
+                self._send_json(200, refresher.status)
+            else:
+                self._send_json(404, {"error": "not found"})
+
+        def do_POST(self):
+            if self.path.rstrip("/") == "/refresh":
+                self._send_json(200, refresher.refresh("http"))
+            else:
+                self._send_json(404, {"error": "not found"})
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), StatusHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Keep the dashboard fresh from a long-running process."
+    )
+    parser.add_argument(
+        "--data",
+        default=os.getenv("SALES_DATA_PATH"),
+        help="Sales data file or Parquet directory, dummy data when not set",
+    )
+    parser.add_argument(
+        "--interval", type=float, default=300.0, help="Seconds between refreshes"
+    )
+    parser.add_argument(
+        "--status-file",
+        default="refresher_status.json",
+        help="Where to write the status JSON",
+    )
+    parser.add_argument(
+        "--port", type=int, default=None, help="Serve the status on this local port"
+    )
+    args = parser.parse_args()
+
+    refresher = Refresher(args.data, args.interval, args.status_file)
+    if args.port is not None:
+        serve_status(refresher, args.port)
+    try:
+        refresher.run()
+    except KeyboardInterrupt:
+        pass
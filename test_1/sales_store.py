@@ -0,0 +1,314 @@
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import argparse
+import glob
+import json
+import os
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import quote
+
+# Manifest with the statistics of every partition file. Files starting with '_' are
+# ignored by pyarrow, so the store can still be read with `pd.read_parquet`.
+STATS_FILE = "_stats.json"
+
+# Columns with min/max statistics in the manifest
+STATS_COLUMNS = ["Fecha", "Ventas", "Prediccion"]
+
+
+def week_window(
+    today: Optional[pd.Timestamp] = None,
+) -> Tuple[pd.Timestamp, pd.Timestamp]:
+    """
+    Calculate the date range read by the functions that compare this week and last week.
+
+    Args:
+        today (pd.Timestamp, optional): The current date. Defaults to today.
+
+    Returns:
+        Tuple[pd.Timestamp, pd.Timestamp]: The Monday of last week and the Sunday of this
+                                           week, both included, as `calculate_weeks`
+                                           never looks outside of them.
+    """
+    today = pd.Timestamp("today") if today is None else pd.Timestamp(today)
+    start_date_this_week = today.normalize() - pd.Timedelta(days=today.weekday())
+    return (
+        start_date_this_week - pd.Timedelta(days=7),
+        start_date_this_week + pd.Timedelta(days=6, hours=23, minutes=59, seconds=59),
+    )
+
+
+class SalesStore:
+    """
+    Local sales store partitioned by year and month, and optionally by region.
+
+    Every partition is a directory such as 'year=2023/month=04/region=Región%201' holding
+    one Parquet file per write. The manifest keeps the number of rows and the min/max of
+    'Fecha', 'Ventas' and 'Prediccion' of each file, so reads only open the files whose
+    dates overlap the requested range. Files are read memory-mapped.
+
+    The store expects a single writer at a time.
+    """
+
+    def __init__(self, root: str, partition_by_region: Optional[bool] = None):
+        self.root = root
+        self._manifest = self._load_manifest()
+        if partition_by_region is not None:
+            if self._manifest["files"] and (
+                partition_by_region != self._manifest["partition_by_region"]
+            ):
+                raise ValueError(
+                    "The store already exists with partition_by_region="
+                    f"{self._manifest['partition_by_region']}"
+                )
+            self._manifest["partition_by_region"] = partition_by_region
+
+    @property
+    def partition_by_region(self) -> bool:
+        return self._manifest["partition_by_region"]
+
+    @property
+    def files(self) -> List[Dict[str, Any]]:
+        """The statistics of every file of the store."""
+        return self._manifest["files"]
+
+    def _load_manifest(self) -> Dict[str, Any]:
+        path = os.path.join(self.root, STATS_FILE)
+        if not os.path.exists(path):
+            return {"partition_by_region": False, "files": []}
+        with open(path, encoding="utf-8") as manifest_file:
+            return json.load(manifest_file)
+
+    def _save_manifest(self):
+        # Replace the manifest atomically, readers never see a partial one
+        path = os.path.join(self.root, STATS_FILE)
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, "w", encoding="utf-8") as manifest_file:
+            json.dump(self._manifest, manifest_file, indent=1)
+        os.replace(temporary_path, path)
+
+    def _partition_dir(self, year: int, month: int, region: Optional[str]) -> str:
+        parts = [f"year={year}", f"month={month:02d}"]
+        if region is not None:
+            parts.append(f"region={quote(str(region), safe='')}")
+        return os.path.join(*parts)
+
+    def write(self, sales_df: pd.DataFrame) -> List[str]:
+        """
+        Append sales rows to the store, one new file per partition they fall in.
+
+        Args:
+            sales_df (pd.DataFrame): Sales data with 'Fecha', 'Producto', 'Región',
+                                     'Ventas' and 'Prediccion' columns.
+
+        Returns:
+            list: The paths of the written files, relative to the root of the store.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        sales_df = sales_df.assign(Fecha=pd.to_datetime(sales_df["Fecha"]))
+        keys = [
+            sales_df["Fecha"].dt.year.rename("year"),
+            sales_df["Fecha"].dt.month.rename("month"),
+        ]
+        if self.partition_by_region:
+            keys.append(sales_df["Región"].astype(str).rename("region"))
+
+        written = []
+        next_part = len(self.files)
+        for key, partition in sales_df.groupby(keys, sort=True):
+            year, month = int(key[0]), int(key[1])
+            region = key[2] if self.partition_by_region else None
+            directory = self._partition_dir(year, month, region)
+            os.makedirs(os.path.join(self.root, directory), exist_ok=True)
+            path = os.path.join(directory, f"part-{next_part:05d}.parquet")
+            next_part += 1
+
+            # Categorical keys are stored as strings so that every file has one schema
+            table = pa.Table.from_pandas(
+                partition.astype(
+                    {
+                        column: str
+                        for column in partition.columns
+                        if isinstance(partition[column].dtype, pd.CategoricalDtype)
+                    }
+                ),
+                preserve_index=False,
+            )
+            pq.write_table(table, os.path.join(self.root, path))
+
+            stats = {
+                "path": path,
+                "year": year,
+                "month": month,
+                "region": region,
+                "rows": len(partition),
+            }
+            for column in STATS_COLUMNS:
+                values = partition[column]
+                if column == "Fecha":
+                    stats["min_Fecha"] = values.min().isoformat()
+                    stats["max_Fecha"] = values.max().isoformat()
+                else:
+                    stats[f"min_{column}"] = _json_number(values.min())
+                    stats[f"max_{column}"] = _json_number(values.max())
+            self.files.append(stats)
+            written.append(path)
+
+        self._save_manifest()
+        return written
+
+    def prune(
+        self,
+        start: Optional[pd.Timestamp] = None,
+        end: Optional[pd.Timestamp] = None,
+        regions: Optional[Iterable[str]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Select the files that may hold rows in a date range and set of regions.
+
+        Args:
+            start (pd.Timestamp, optional): First date, included. None for no lower bound.
+            end (pd.Timestamp, optional): Last date, included. None for no upper bound.
+            regions (Iterable[str], optional): Regions to read. Only prunes stores
+                                               partitioned by region. None reads all.
+
+        Returns:
+            list: The statistics of the selected files.
+        """
+        regions = None if regions is None else {str(region) for region in regions}
+        selected = []
+        for stats in self.files:
+            if start is not None and pd.Timestamp(stats["max_Fecha"]) < start:
+                continue
+            if end is not None and pd.Timestamp(stats["min_Fecha"]) > end:
+                continue
+            if (
+                regions is not None
+                and stats["region"] is not None
+                and stats["region"] not in regions
+            ):
+                continue
+            selected.append(stats)
+        return selected
+
+    def read(
+        self,
+        start: Optional[pd.Timestamp] = None,
+        end: Optional[pd.Timestamp] = None,
+        regions: Optional[Iterable[str]] = None,
+        columns: Optional[List[str]] = None,
+    ) -> pd.DataFrame:
+        """
+        Read the sales rows in a date range, opening only the files that overlap it.
+
+        Args:
+            start (pd.Timestamp, optional): First date, included. None for no lower bound.
+            end (pd.Timestamp, optional): Last date, included. None for no upper bound.
+            regions (Iterable[str], optional): Regions to read. None reads all of them.
+            columns (list, optional): Columns to read. None reads all of them.
+
+        Returns:
+            pd.DataFrame: The rows, in the order they were written.
+        """
+        filters = []
+        if start is not None:
+            filters.append(("Fecha", ">=", pd.Timestamp(start)))
+        if end is not None:
+            filters.append(("Fecha", "<=", pd.Timestamp(end)))
+        if regions is not None:
+            filters.append(("Región", "in", [str(region) for region in regions]))
+
+        tables = [
+            # Memory-mapped, the pages of the file are shared with the OS cache
+            pq.read_table(
+                os.path.join(self.root, stats["path"]),
+                columns=columns,
+                filters=filters or None,
+                memory_map=True,
+            )
+            for stats in self.prune(start, end, regions)
+        ]
+        if not tables:
+            return self._empty_frame(columns)
+        return pa.concat_tables(tables).to_pandas()
+
+    def read_window(
+        self, today: Optional[pd.Timestamp] = None, columns: Optional[List[str]] = None
+    ) -> pd.DataFrame:
+        """
+        Read the rows of last week and this week, see `week_window`.
+
+        Args:
+            today (pd.Timestamp, optional): The current date. Defaults to today.
+            columns (list, optional): Columns to read. None reads all of them.
+
+        Returns:
+            pd.DataFrame: The rows of the window.
+        """
+        start, end = week_window(today)
+        return self.read(start, end, columns=columns)
+
+    def _empty_frame(self, columns: Optional[List[str]]) -> pd.DataFrame:
+        if self.files:
+            schema = pq.read_schema(os.path.join(self.root, self.files[0]["path"]))
+            frame = schema.empty_table().to_pandas()
+        else:
+            frame = pd.DataFrame(
+                {
+                    "Fecha": pd.Series(dtype="datetime64[ns]"),
+                    "Producto": pd.Series(dtype=object),
+                    "Región": pd.Series(dtype=object),
+                    "Ventas": pd.Series(dtype="float64"),
+                    "Prediccion": pd.Series(dtype="float64"),
+                }
+            )
+        return frame if columns is None else frame[columns]
+
+
+def _json_number(value: Any) -> Optional[float]:
+    value = float(value)
+    return None if pd.isna(value) else value
+
+
+def is_store(path: Optional[str]) -> bool:
+    """
+    Check whether a path is the root of a `SalesStore`.
+
+    Args:
+        path (str, optional): The path to check.
+
+    Returns:
+        bool: True if the path holds a store manifest.
+    """
+    return path is not None and os.path.exists(os.path.join(path, STATS_FILE))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Ingest Parquet or CSV sales files into a partitioned sales store."
+    )
+    parser.add_argument("store", help="Root directory of the store")
+    parser.add_argument(
+        "inputs",
+        nargs="+",
+        help="Files or directories of Parquet files, e.g. the output of prueba_acceso.py",
+    )
+    parser.add_argument(
+        "--by-region", action="store_true", help="Also partition by region"
+    )
+    args = parser.parse_args()
+
+    store = SalesStore(args.store, partition_by_region=args.by_region)
+    for input_path in args.inputs:
+        if os.path.isdir(input_path):
+            paths = sorted(glob.glob(os.path.join(input_path, "*.parquet")))
+        else:
+            paths = [input_path]
+        for path in paths:
+            if path.endswith(".csv"):
+                sales_df = pd.read_csv(path, parse_dates=["Fecha"])
+            else:
+                sales_df = pd.read_parquet(path)
+            store.write(sales_df)
+    print(f"{len(store.files)} files in {args.store}")
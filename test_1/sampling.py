@@ -0,0 +1,442 @@
+import pandas as pd
+import numpy as np
+
+import timeit
+from statistics import NormalDist
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from kernels import encode_keys, factorize
+from utils import OTHER_LABEL, calculate_weeks, top_k_mask
+
+# Strata smaller than this are read in full, so every stratum has enough rows to
+# estimate its variance
+MIN_STRATUM_SAMPLE = 10
+
+# Fraction of each stratum used to size the sample for a target error
+PILOT_FRACTION = 0.01
+
+
+class StratifiedSample:
+    """
+    Random sample of the sales rows, stratified by region, product and month.
+
+    Every stratum is sampled independently with the same probability, and strata with fewer
+    than `MIN_STRATUM_SAMPLE` rows are read in full. Totals over any domain of rows are
+    estimated with the stratified estimator, sum over strata of N_h * mean_h, along with
+    its variance.
+
+    The sample is drawn in a single pass over the rows, and is meant to be drawn once per
+    version of the data and shared by every approximate chart. When sized for a target
+    error, the pilot sample is the rows whose draw falls below the pilot probability, so
+    it reuses the strata and the draws of the sample.
+    """
+
+    def __init__(
+        self,
+        sales_df: pd.DataFrame,
+        fraction: Optional[float] = 0.01,
+        seed: int = 0,
+        target_relative_error: Optional[float] = None,
+        confidence: float = 0.95,
+    ):
+        region_codes, regions = factorize(sales_df["Región"])
+        product_codes, products = factorize(sales_df["Producto"])
+        months = (
+            pd.to_datetime(sales_df["Fecha"]).to_numpy().astype("datetime64[M]")
+        ).astype("int64")
+        first_month = months.min() if len(months) else 0
+        num_months = int(months.max() - first_month) + 1 if len(months) else 1
+
+        # Number the observed (region, product, month) cells, without hashing the rows
+        cells = (
+            region_codes.astype(np.intp) * len(products) + product_codes
+        ) * num_months + (months - first_month)
+        counts = np.bincount(cells, minlength=len(regions) * len(products) * num_months)
+        observed = np.flatnonzero(counts)
+        numbers = np.zeros(len(counts), dtype=np.intp)
+        numbers[observed] = np.arange(len(observed))
+        strata = numbers[cells]
+
+        self.confidence = confidence
+        self.population_sizes = counts[observed]
+        self.stratum_regions = np.asarray(regions)[
+            observed // (len(products) * num_months)
+        ]
+
+        # A Bernoulli draw per row keeps the sampling a single linear pass
+        draws = np.random.default_rng(seed).random(len(strata))
+        if target_relative_error is not None:
+            pilot = draws < self._probability(PILOT_FRACTION)[strata]
+            fraction = self._fraction_for_error(
+                strata[pilot],
+                sales_df["Ventas"].to_numpy()[pilot],
+                target_relative_error,
+            )
+        self.fraction = fraction
+        keep = draws < self._probability(fraction)[strata]
+
+        self.rows = sales_df.loc[keep]
+        self.strata = strata[keep]
+        self.sample_sizes = np.bincount(
+            self.strata, minlength=len(self.population_sizes)
+        )
+
+    def _probability(self, fraction: float) -> np.ndarray:
+        return np.minimum(
+            1.0, np.maximum(fraction, MIN_STRATUM_SAMPLE / self.population_sizes)
+        )
+
+    def _fraction_for_error(
+        self, strata: np.ndarray, values: np.ndarray, target_relative_error: float
+    ) -> float:
+        # The stratum variances S_h^2 are estimated from the pilot rows. With the same
+        # fraction f in every stratum, the variance of the total is
+        # (1 - f) / f * sum(N_h * S_h^2), which gives the smallest fraction meeting the
+        # target.
+        num_strata = len(self.population_sizes)
+        sizes = np.maximum(np.bincount(strata, minlength=num_strata), 1)
+        sums = np.bincount(strata, weights=values, minlength=num_strata)
+        squares = np.bincount(strata, weights=values**2, minlength=num_strata)
+        means = sums / sizes
+        variances = np.maximum(
+            (squares - sizes * means**2) / np.maximum(sizes - 1, 1), 0
+        )
+
+        total = (self.population_sizes * means).sum()
+        spread = (self.population_sizes * variances).sum()
+        z = NormalDist().inv_cdf((1 + self.confidence) / 2)
+        bound = (target_relative_error * total / z) ** 2
+        if spread + bound == 0:
+            return PILOT_FRACTION
+        return float(min(1.0, max(PILOT_FRACTION, spread / (spread + bound))))
+
+    def select(self, regions: List[str]) -> "StratifiedSample":
+        """
+        Keep the strata of some regions, as drawn for the whole data.
+
+        Args:
+            regions (List[str]): The regions to keep.
+
+        Returns:
+            StratifiedSample: The sample of those regions.
+        """
+        kept = np.isin(self.stratum_regions, list(regions))
+        numbers = np.cumsum(kept) - 1
+        rows = kept[self.strata]
+
+        selected = object.__new__(StratifiedSample)
+        selected.confidence = self.confidence
+        selected.fraction = self.fraction
+        selected.population_sizes = self.population_sizes[kept]
+        selected.stratum_regions = self.stratum_regions[kept]
+        selected.rows = self.rows.loc[rows]
+        selected.strata = numbers[self.strata[rows]]
+        selected.sample_sizes = self.sample_sizes[kept]
+        return selected
+
+    def stratum_moments(
+        self, domains: np.ndarray, num_domains: int, values: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Calculate the sample mean and variance of a value per domain and stratum.
+
+        The value is taken as 0 for the rows of a stratum outside of the domain.
+
+        Args:
+            domains (np.ndarray): Domain code of each sampled row, -1 for rows outside of
+                                  every domain.
+            num_domains (int): Number of domains.
+            values (np.ndarray): Value of each sampled row.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: The means and variances, both with one row per
+                                           domain and one column per stratum.
+        """
+        num_strata = len(self.population_sizes)
+        domains = np.asarray(domains, dtype=np.intp)
+        inside = domains >= 0
+        cells = domains[inside] * num_strata + self.strata[inside]
+        weights = values[inside].astype("float64")
+        size = num_domains * num_strata
+
+        # Rows outside of the domain add 0 to both sums, so only the rows inside count
+        sums = np.bincount(cells, weights=weights, minlength=size)
+        squares = np.bincount(cells, weights=weights**2, minlength=size)
+        sums = sums.reshape(num_domains, num_strata)
+        squares = squares.reshape(num_domains, num_strata)
+
+        sampled = np.maximum(self.sample_sizes, 1)
+        means = sums / sampled
+        variances = np.where(
+            self.sample_sizes > 1,
+            (squares - sampled * means**2) / np.maximum(self.sample_sizes - 1, 1),
+            0.0,
+        )
+        return means, np.maximum(variances, 0.0)
+
+    def domain_totals(
+        self, domains: np.ndarray, num_domains: int, values: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Estimate the total of a value over each domain of rows.
+
+        Args:
+            domains (np.ndarray): Domain code of each sampled row, -1 for rows outside of
+                                  every domain.
+            num_domains (int): Number of domains.
+            values (np.ndarray): Value of each sampled row.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: The estimated total of each domain and the
+                                           variance of the estimate.
+        """
+        means, variances = self.stratum_moments(domains, num_domains, values)
+        population = self.population_sizes
+        sampled = np.maximum(self.sample_sizes, 1)
+        totals = (population * means).sum(axis=1)
+        variance = (
+            population**2 * (1 - self.sample_sizes / population) * variances / sampled
+        ).sum(axis=1)
+        return totals, variance
+
+
+def draw_preview_sample(
+    sales_df: pd.DataFrame,
+    fraction: Optional[float] = 0.01,
+    target_relative_error: Optional[float] = None,
+    confidence: float = 0.95,
+    seed: int = 0,
+) -> StratifiedSample:
+    """
+    Draw the sample of the approximate charts.
+
+    Args:
+        sales_df (pd.DataFrame): The sales data.
+        fraction (float, optional): Fraction of the rows to sample.
+        target_relative_error (float, optional): Size the sample to estimate the total
+                                                 sales within this relative error instead,
+                                                 e.g. 0.01.
+        confidence (float): Confidence level of the target error and of the intervals.
+        seed (int): Seed of the sample.
+
+    Returns:
+        StratifiedSample: The sample.
+    """
+    return StratifiedSample(sales_df, fraction, seed, target_relative_error, confidence)
+
+
+def sample_fraction_for_error(
+    sales_df: pd.DataFrame,
+    target_relative_error: float,
+    confidence: float = 0.95,
+    seed: int = 0,
+) -> float:
+    """
+    Size the sample so that the total sales are estimated within a relative error.
+
+    Args:
+        sales_df (pd.DataFrame): The sales data.
+        target_relative_error (float): Half width of the confidence interval of the total
+                                       sales, relative to the total, e.g. 0.01.
+        confidence (float): Confidence level of the interval.
+        seed (int): Seed of the pilot sample.
+
+    Returns:
+        float: The sample fraction, between the pilot fraction and 1.
+    """
+    return draw_preview_sample(
+        sales_df, None, target_relative_error, confidence, seed
+    ).fraction
+
+
+def _half_width(variance: np.ndarray, confidence: float) -> np.ndarray:
+    return NormalDist().inv_cdf((1 + confidence) / 2) * np.sqrt(variance)
+
+
+def approximate_sales_percentage_by_region(
+    sample: StratifiedSample, top_k: Optional[int] = None
+) -> List[Dict[str, Union[str, float]]]:
+    """
+    Estimate the percentage of sales by region from a stratified sample.
+
+    Approximate counterpart of `calculate_sales_percentage_by_region`.
+
+    Args:
+        sample (StratifiedSample): The sample of the sales data.
+        top_k (int, optional): Maximum number of regions to show. The remaining regions are
+                               summed into an "Other" slice. None shows every region.
+
+    Returns:
+        list: One dictionary per region with 'Región', 'Percentage', and the bounds of its
+              confidence interval, 'Percentage_low' and 'Percentage_high'.
+    """
+    # Only the regions in the sample, as for the exact chart
+    region_codes, regions = pd.factorize(sample.rows["Región"], sort=True)
+    values = sample.rows["Ventas"].to_numpy()
+    region_totals, _ = sample.domain_totals(region_codes, len(regions), values)
+
+    # Fold the regions with the smallest estimates into "Other", which is estimated as a
+    # domain of its own
+    mask = top_k_mask(region_totals, top_k)
+    if not mask.all():
+        domains = np.where(mask, np.cumsum(mask) - 1, mask.sum())
+        region_codes = np.where(region_codes >= 0, domains[region_codes], -1)
+        regions = list(np.asarray(regions)[mask]) + [OTHER_LABEL]
+    region_totals, region_variance = sample.domain_totals(
+        region_codes, len(regions), values
+    )
+    total, total_variance = sample.domain_totals(
+        np.zeros(len(values), dtype=np.intp), 1, values
+    )
+
+    # Delta method for a ratio, the strata are nested in the regions so the covariance
+    # of a region with the total is the variance of the region
+    ratio = region_totals / total[0]
+    ratio_variance = (
+        region_variance * (1 - 2 * ratio) + ratio**2 * total_variance[0]
+    ) / total[0] ** 2
+    half_width = _half_width(np.maximum(ratio_variance, 0.0), sample.confidence)
+
+    return [
+        {
+            "Región": region,
+            "Percentage": round(ratio[position] * 100, 3),
+            "Percentage_low": round((ratio[position] - half_width[position]) * 100, 3),
+            "Percentage_high": round((ratio[position] + half_width[position]) * 100, 3),
+        }
+        for position, region in enumerate(regions)
+    ]
+
+
+def approximate_sales_by_day_of_the_week(sample: StratifiedSample) -> Dict[str, Any]:
+    """
+    Estimate the sales and predictions by day of the week from a stratified sample.
+
+    Approximate counterpart of `calculate_sales_by_day_of_the_week`, every value has its
+    confidence interval in the '<name>_low' and '<name>_high' keys.
+
+    Args:
+        sample (StratifiedSample): The sample of the sales data.
+
+    Returns:
+        dict: The same dictionary as `calculate_sales_by_day_of_the_week`.
+    """
+    (
+        mask_this_week,
+        mask_last_week,
+        start_date,
+        end_date,
+        start_date_last_week,
+        end_date_last_week,
+    ) = calculate_weeks(sample.rows)
+    weekday = sample.rows["Fecha"].dt.weekday.to_numpy()
+
+    days_of_week = [
+        "Monday",
+        "Tuesday",
+        "Wednesday",
+        "Thursday",
+        "Friday",
+        "Saturday",
+        "Sunday",
+    ]
+    estimates = {}
+    for week, mask in (("this week", mask_this_week), ("last week", mask_last_week)):
+        domains = np.where(mask.to_numpy(), weekday, -1)
+        for name, column in (("Sales", "Ventas"), ("Prediction", "Prediccion")):
+            totals, variance = sample.domain_totals(
+                domains, len(days_of_week), sample.rows[column].to_numpy()
+            )
+            estimates[f"{name} {week}"] = (
+                totals,
+                _half_width(variance, sample.confidence),
+            )
+
+    output_list = []
+    for position, day in enumerate(days_of_week):
+        day_data = {"Day_of_Week": day}
+        for name, (totals, half_width) in estimates.items():
+            day_data[name] = totals[position]
+            day_data[f"{name}_low"] = totals[position] - half_width[position]
+            day_data[f"{name}_high"] = totals[position] + half_width[position]
+        output_list.append(day_data)
+
+    return {
+        "days_data": output_list,
+        "start_date": start_date.strftime("%d%m%Y"),
+        "end_date": end_date.strftime("%d%m%Y"),
+        "start_date_last_week": start_date_last_week.strftime("%d-%m-%Y"),
+        "end_date_last_week": end_date_last_week.strftime("%d-%m-%Y"),
+    }
+
+
+def _benchmark(num_rows: int = 1_500_000, fraction: float = 0.01, repeat: int = 5):
+    from planner import Scan, run_scan
+    from prueba_acceso import generar_shard_ventas
+    from utils import (
+        calculate_sales_by_day_of_the_week,
+        calculate_sales_percentage_by_region,
+    )
+
+    num_days, num_products = 1500, 20
+    today = pd.Timestamp(pd.Timestamp.today().date())
+    sales_df = encode_keys(
+        generar_shard_ventas(
+            today - pd.Timedelta(days=num_days - 30),
+            num_dias=num_days,
+            num_productos=num_products,
+            num_regiones=8,
+            lineas_por_dia=(1, 2 * num_rows // (num_days * num_products)),
+            semilla=np.random.SeedSequence(0),
+        ).fillna(0)
+    )
+
+    # The exact charts scan every row, the approximate ones only read the sample,
+    # drawn once per version of the data
+    sample = draw_preview_sample(sales_df, fraction)
+    region_scan = Scan(None, "M", ("Región",), ())
+    weekday_scan = Scan(None, "D", (), ())
+    cases = {
+        "Sales by region": (
+            lambda: calculate_sales_percentage_by_region(
+                run_scan(sales_df, region_scan), top_k=10
+            ),
+            lambda: approximate_sales_percentage_by_region(sample, top_k=10),
+        ),
+        "Sales by day of the week": (
+            lambda: calculate_sales_by_day_of_the_week(
+                run_scan(sales_df, weekday_scan)
+            ),
+            lambda: approximate_sales_by_day_of_the_week(sample),
+        ),
+    }
+
+    sample_time = min(
+        timeit.repeat(
+            lambda: draw_preview_sample(sales_df, fraction), number=1, repeat=repeat
+        )
+    )
+    error_time = min(
+        timeit.repeat(
+            lambda: draw_preview_sample(sales_df, None, target_relative_error=0.01),
+            number=1,
+            repeat=repeat,
+        )
+    )
+    print(
+        f"{len(sales_df)} rows, best of {repeat}. Sample of {len(sample.rows)} rows "
+        f"drawn in {sample_time * 1000:.1f} ms ({error_time * 1000:.1f} ms for a 1% "
+        f"target error), once per version of the data"
+    )
+    for name, (exact_path, preview_path) in cases.items():
+        exact_time = min(timeit.repeat(exact_path, number=1, repeat=repeat))
+        preview_time = min(timeit.repeat(preview_path, number=1, repeat=repeat))
+        print(
+            f"{name}: exact {exact_time * 1000:.1f} ms, "
+            f"preview {preview_time * 1000:.1f} ms "
+            f"({exact_time / preview_time:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    _benchmark()
@@ -0,0 +1,198 @@
+import pandas as pd
+import numpy as np
+
+from dataclasses import dataclass
+from multiprocessing import Pool, util
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Callable, Iterable, List, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class DailyCubeHandle:
+    """
+    Picklable reference to a daily cube stored in shared memory.
+
+    Only the name of the shared memory block and the labels of each axis are sent to the
+    worker processes, the sales and prediction values are never copied.
+    """
+
+    name: str
+    start_date: pd.Timestamp
+    num_days: int
+    regions: Tuple[str, ...]
+    products: Tuple[str, ...]
+
+    @property
+    def shape(self) -> Tuple[int, int, int, int]:
+        # (value, region, day, product), value 0 is 'Ventas' and value 1 is 'Prediccion'
+        return (2, len(self.regions), self.num_days, len(self.products))
+
+    def attach(self) -> "DailyCube":
+        """Attach to the shared memory block without copying it."""
+        return DailyCube(self, SharedMemory(name=self.name), owner=False)
+
+
+class DailyCube:
+    """
+    Daily region x product sales and predictions backed by a shared memory block.
+
+    The values are exposed as NumPy views over the block, so every process attached to
+    the same handle reads the same memory.
+    """
+
+    def __init__(self, handle: DailyCubeHandle, shm: SharedMemory, owner: bool):
+        self.handle = handle
+        self._shm = shm
+        self._owner = owner
+        self.values = np.ndarray(handle.shape, dtype="float64", buffer=shm.buf)
+
+    @property
+    def sales(self) -> np.ndarray:
+        return self.values[0]
+
+    @property
+    def predictions(self) -> np.ndarray:
+        return self.values[1]
+
+    @property
+    def dates(self) -> pd.DatetimeIndex:
+        return pd.date_range(
+            self.handle.start_date, periods=self.handle.num_days, freq="D"
+        )
+
+    def close(self):
+        """Release this process' view and, for the creator, free the block."""
+        # The array must not outlive the buffer it points to
+        del self.values
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+
+    def __enter__(self) -> "DailyCube":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def build_daily_cube(sales_df: pd.DataFrame) -> DailyCube:
+    """
+    Reduce the sales data to daily region x product totals in a shared memory block.
+
+    Args:
+        sales_df (pd.DataFrame): The sales data, with 'Fecha', 'Región', 'Producto',
+                                 'Ventas' and 'Prediccion' columns.
+
+    Returns:
+        DailyCube: The cube owning the shared memory block. Call `close` (or use it as a
+                   context manager) to free the block once the workers are done.
+
+    Raises:
+        ValueError: If there are no rows, an empty block cannot be created.
+    """
+    if sales_df.empty:
+        raise ValueError("Cannot build a daily cube without rows")
+    dates = pd.to_datetime(sales_df["Fecha"]).dt.normalize()
+    start_date = dates.min()
+    day_codes = ((dates - start_date) // pd.Timedelta(days=1)).to_numpy()
+    region_codes, regions = pd.factorize(sales_df["Región"], sort=True)
+    product_codes, products = pd.factorize(sales_df["Producto"], sort=True)
+
+    handle_args = {
+        "start_date": start_date,
+        "num_days": int(day_codes.max()) + 1,
+        "regions": tuple(regions),
+        "products": tuple(products),
+    }
+    num_cells = len(regions) * handle_args["num_days"] * len(products)
+    shm = SharedMemory(create=True, size=2 * num_cells * 8)
+    handle = DailyCubeHandle(name=shm.name, **handle_args)
+    cube = DailyCube(handle, shm, owner=True)
+
+    # Sum every row into its (region, day, product) cell in a single pass per value
+    cells = (region_codes * handle.num_days + day_codes) * len(products) + product_codes
+    for position, column in enumerate(["Ventas", "Prediccion"]):
+        cube.values[position].reshape(-1)[:] = np.bincount(
+            cells,
+            weights=sales_df[column].fillna(0).to_numpy(dtype="float64"),
+            minlength=num_cells,
+        )
+
+    return cube
+
+
+_worker_cube: Optional[DailyCube] = None
+
+
+def _attach_worker(handle: DailyCubeHandle):
+    global _worker_cube
+    _worker_cube = handle.attach()
+    # Pool workers skip the atexit handlers, their finalizers run when they exit
+    util.Finalize(None, _worker_cube.close, exitpriority=0)
+
+
+def _call_worker(task: Tuple[Callable[[DailyCube, Any], Any], Any]) -> Any:
+    func, item = task
+    return func(_worker_cube, item)
+
+
+def parallel_map(
+    cube: DailyCube,
+    func: Callable[[DailyCube, Any], Any],
+    items: Iterable[Any],
+    processes: Optional[int] = None,
+) -> List[Any]:
+    """
+    Run `func(cube, item)` for every item in a pool of worker processes.
+
+    Each worker attaches to the cube once when it starts, so the tasks only carry the
+    item and the result, and releases its attachment when the pool is closed.
+
+    Args:
+        cube (DailyCube): The cube to share with the workers.
+        func (Callable): Module level function taking the attached cube and one item.
+        items (Iterable): The items to process, e.g. region indexes.
+        processes (int, optional): Number of worker processes. By default, one per CPU.
+
+    Returns:
+        list: The results in the same order as `items`.
+    """
+    pool = Pool(processes, initializer=_attach_worker, initargs=(cube.handle,))
+    try:
+        results = pool.map(_call_worker, [(func, item) for item in items])
+        # Let the workers exit on their own, so that they close their attachment
+        pool.close()
+        pool.join()
+        return results
+    finally:
+        pool.terminate()
+
+
+def region_daily_totals(cube: DailyCube, region_index: int) -> pd.DataFrame:
+    """
+    Calculate the daily sales and predictions of one region across all products.
+
+    Args:
+        cube (DailyCube): The attached cube.
+        region_index (int): Position of the region in `cube.handle.regions`.
+
+    Returns:
+        pd.DataFrame: One row per day with 'Fecha', 'Ventas' and 'Prediccion' columns.
+    """
+    return pd.DataFrame(
+        {
+            "Fecha": cube.dates,
+            "Ventas": cube.sales[region_index].sum(axis=1),
+            "Prediccion": cube.predictions[region_index].sum(axis=1),
+        }
+    )
+
+
+if __name__ == "__main__":
+    from prueba_acceso import generar_datos_ventas
+
+    with build_daily_cube(generar_datos_ventas(1000)) as daily_cube:
+        regions = daily_cube.handle.regions
+        totals = parallel_map(daily_cube, region_daily_totals, range(len(regions)))
+        for region, region_totals in zip(regions, totals):
+            print(region, region_totals[["Ventas", "Prediccion"]].sum().to_dict())
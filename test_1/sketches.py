@@ -0,0 +1,422 @@
+import pandas as pd
+import numpy as np
+
+import datetime
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+# Quantiles shown on the charts
+QUANTILES = (0.5, 0.9, 0.99)
+
+# Capacity of the top compactor of a sketch, the rank error shrinks as 1 / k
+SKETCH_SIZE = 400
+
+# Group key of the sketches, a region and a product
+Group = Tuple[str, str]
+
+
+class KLLSketch:
+    """
+    KLL quantile sketch: a stack of compactors holding a bounded sample of the values.
+
+    Level h holds values that each stand for 2^h inserted values. When a level goes over
+    its capacity, it is sorted and every other value, starting at a random offset, is
+    promoted to the next level. Capacities shrink geometrically towards the lower levels,
+    so the memory is O(k) however many values are inserted, and two sketches merge by
+    concatenating their levels.
+    """
+
+    def __init__(
+        self, k: int = SKETCH_SIZE, seed: Optional[Union[int, Sequence[int]]] = None
+    ):
+        self.k = k
+        self.count = 0
+        self.levels: List[np.ndarray] = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return max(2, int(np.ceil(self.k * (2 / 3) ** depth)))
+
+    def _compress(self):
+        # Lazy compaction: only compact while the sketch is over its total capacity, and
+        # then the lowest level over its own capacity
+        while len(self) > sum(
+            self._capacity(level) for level in range(len(self.levels))
+        ):
+            level = next(
+                level
+                for level, items in enumerate(self.levels)
+                if len(items) > self._capacity(level)
+            )
+            if level + 1 == len(self.levels):
+                self.levels.append(np.empty(0))
+
+            # An odd item out stays at this level, the rest are halved into the next one
+            items = np.sort(self.levels[level])
+            kept = items[: len(items) % 2]
+            promoted = items[len(kept) :][self._rng.integers(2) :: 2]
+            self.levels[level] = kept
+            self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+
+    def update(self, values: Union[np.ndarray, Sequence[float]]):
+        """
+        Insert a batch of values, NaN values are ignored.
+
+        Args:
+            values (np.ndarray): The values to insert.
+        """
+        values = np.asarray(values, dtype="float64")
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self.count += len(values)
+        self._compress()
+
+    def merge(self, other: "KLLSketch") -> "KLLSketch":
+        """
+        Add the values of another sketch to this one.
+
+        Args:
+            other (KLLSketch): The sketch to merge, left unchanged.
+
+        Returns:
+            KLLSketch: This sketch.
+        """
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.count += other.count
+        self._compress()
+        return self
+
+    def quantiles(self, qs: Sequence[float]) -> np.ndarray:
+        """
+        Estimate quantiles of the inserted values.
+
+        Args:
+            qs (Sequence[float]): The quantiles, between 0 and 1.
+
+        Returns:
+            np.ndarray: One estimate per quantile, NaN when the sketch is empty.
+        """
+        if not self.count:
+            return np.full(len(qs), np.nan)
+        items = np.concatenate(self.levels)
+        weights = np.concatenate(
+            [
+                np.full(len(level), 2.0**height)
+                for height, level in enumerate(self.levels)
+            ]
+        )
+        order = np.argsort(items, kind="stable")
+        cumulative = np.cumsum(weights[order])
+        positions = np.searchsorted(
+            cumulative, np.asarray(qs) * cumulative[-1], side="left"
+        )
+        return items[order][np.minimum(positions, len(items) - 1)]
+
+    def __len__(self) -> int:
+        return sum(len(level) for level in self.levels)
+
+
+class SalesSketches:
+    """
+    Streaming ticket size and daily sales distributions per region and product.
+
+    Every row with sales is a ticket. Daily sales are the total sales of a group in a
+    day: the totals stay open while rows of that day may still arrive, in any order and
+    from any chunk or merged aggregator, and are added to the sketches only when they
+    are closed, either with `close_days` once every row before a watermark has been
+    seen or with `finalize`. Only the sales up to today are sketched, forecast rows are
+    skipped.
+
+    The memory of the sketches depends on the number of groups, not on the number of
+    rows, the open days add one total per group and day until they are closed. Sketches
+    built from different chunks or processes are combined with `merge`.
+    """
+
+    def __init__(self, k: int = SKETCH_SIZE, seed: int = 0):
+        self.k = k
+        self.seed = seed
+        self.tickets: Dict[Group, KLLSketch] = {}
+        self.daily: Dict[Group, KLLSketch] = {}
+        # Totals of the days that are still open, by group and day
+        self.open_days: Dict[Group, Dict[pd.Timestamp, float]] = {}
+        # Every day before the watermark is closed, None while no day has been closed
+        self.watermark: Optional[pd.Timestamp] = None
+
+    def _seed(self, key: Tuple[str, ...]) -> List[int]:
+        # A different seed per key keeps the compaction offsets independent, and taking
+        # it from the key rather than from the other groups gives the sketches of some
+        # regions the same estimates as when only their rows are sketched
+        return [self.seed, zlib.crc32("\x1f".join(key).encode("utf-8"))]
+
+    def _sketch(self, sketches: Dict[Group, KLLSketch], group: Group) -> KLLSketch:
+        if group not in sketches:
+            sketches[group] = KLLSketch(self.k, seed=self._seed(group))
+        return sketches[group]
+
+    def update(self, sales_df: pd.DataFrame) -> "SalesSketches":
+        """
+        Add a chunk of sales rows. Their days stay open until they are closed.
+
+        Args:
+            sales_df (pd.DataFrame): Sales rows with 'Fecha', 'Región', 'Producto' and
+                                     'Ventas' columns.
+
+        Returns:
+            SalesSketches: This object.
+
+        Raises:
+            ValueError: If a row is dated before the watermark, its day is already closed.
+        """
+        fecha = pd.to_datetime(sales_df["Fecha"])
+        today = pd.Timestamp(datetime.date.today())
+        rows = sales_df.loc[(fecha <= today) & (sales_df["Ventas"] > 0)]
+        if rows.empty:
+            return self
+
+        day = pd.to_datetime(rows["Fecha"]).dt.normalize()
+        if self.watermark is not None and day.min() < self.watermark:
+            raise ValueError(
+                f"Rows of {day.min():%Y-%m-%d} arrived after its day was closed"
+            )
+        keys = [rows["Región"].astype(str), rows["Producto"].astype(str)]
+
+        # Tickets: one batch insert per group
+        for group, ventas in rows["Ventas"].groupby(keys, sort=False):
+            self._sketch(self.tickets, group).update(ventas.to_numpy())
+
+        # Daily sales: add to the open days
+        daily = rows["Ventas"].groupby(keys + [day.rename("Fecha")], sort=False).sum()
+        for (region, product, date), total in daily.items():
+            days = self.open_days.setdefault((region, product), {})
+            days[date] = days.get(date, 0.0) + total
+        return self
+
+    def close_days(self, watermark: pd.Timestamp) -> "SalesSketches":
+        """
+        Add the days before a watermark to the daily sales sketches.
+
+        Only close a day once every row of it has been added to this aggregator, e.g.
+        after the last chunk of that day when the chunks are sorted by date. Rows and
+        merged aggregators with open days before the watermark are rejected afterwards.
+
+        Args:
+            watermark (pd.Timestamp): The first day that stays open.
+
+        Returns:
+            SalesSketches: This object.
+        """
+        watermark = pd.Timestamp(watermark).normalize()
+        for group, days in self.open_days.items():
+            closed = sorted(date for date in days if date < watermark)
+            if closed:
+                self._sketch(self.daily, group).update(
+                    [days.pop(date) for date in closed]
+                )
+        self.open_days = {group: days for group, days in self.open_days.items() if days}
+        if self.watermark is None or watermark > self.watermark:
+            self.watermark = watermark
+        return self
+
+    def finalize(self) -> "SalesSketches":
+        """
+        Close every open day, once all the rows have been added or merged.
+
+        Returns:
+            SalesSketches: This object.
+        """
+        last_days = [max(days) for days in self.open_days.values() if days]
+        if last_days:
+            self.close_days(max(last_days) + pd.Timedelta(days=1))
+        return self
+
+    def merge(self, other: "SalesSketches") -> "SalesSketches":
+        """
+        Add the sketches of another aggregator, e.g. built from another chunk.
+
+        The open days of both are summed and stay open, so a day split across chunks
+        is counted once.
+
+        Args:
+            other (SalesSketches): The aggregator to merge, left unchanged.
+
+        Returns:
+            SalesSketches: This object.
+
+        Raises:
+            ValueError: If either aggregator has open days that the other already closed.
+        """
+        for first, second in ((self, other), (other, self)):
+            if first.watermark is not None and any(
+                date < first.watermark
+                for days in second.open_days.values()
+                for date in days
+            ):
+                raise ValueError("Cannot merge open days that are already closed")
+
+        for mine, theirs in ((self.tickets, other.tickets), (self.daily, other.daily)):
+            for group, sketch in theirs.items():
+                self._sketch(mine, group).merge(sketch)
+        for group, days in other.open_days.items():
+            own_days = self.open_days.setdefault(group, {})
+            for date, total in days.items():
+                own_days[date] = own_days.get(date, 0.0) + total
+        if other.watermark is not None and (
+            self.watermark is None or other.watermark > self.watermark
+        ):
+            self.watermark = other.watermark
+        return self
+
+    def select(self, regions: Iterable[str]) -> "SalesSketches":
+        """
+        Keep the groups of some regions.
+
+        Args:
+            regions (Iterable[str]): The regions to keep.
+
+        Returns:
+            SalesSketches: A new aggregator sharing the sketches of those regions.
+        """
+        regions = {str(region) for region in regions}
+        selected = SalesSketches(self.k, self.seed)
+        selected.tickets = {
+            group: sketch
+            for group, sketch in self.tickets.items()
+            if group[0] in regions
+        }
+        selected.daily = {
+            group: sketch for group, sketch in self.daily.items() if group[0] in regions
+        }
+        selected.open_days = {
+            group: dict(days)
+            for group, days in self.open_days.items()
+            if group[0] in regions
+        }
+        selected.watermark = self.watermark
+        return selected
+
+    def records(
+        self,
+        metric: str = "tickets",
+        by: Sequence[str] = ("Región", "Producto"),
+        quantiles: Sequence[float] = QUANTILES,
+    ) -> List[Dict[str, Union[str, float, int]]]:
+        """
+        Estimate the quantiles of a distribution as chart records.
+
+        Args:
+            metric (str): 'tickets' for the ticket size or 'daily' for the daily sales.
+            by (Sequence[str]): 'Región', 'Producto' or both. The sketches of the groups
+                                with the same key are merged.
+            quantiles (Sequence[float]): The quantiles to estimate.
+
+        Returns:
+            list: One dictionary per key, sorted, with the key columns, one 'pNN' entry
+                  per quantile rounded to 2 decimals and the 'count' of values.
+        """
+        if metric == "tickets":
+            sketches = self.tickets
+        elif metric == "daily":
+            # Include the open days without closing them
+            sketches = {
+                group: KLLSketch(self.k, seed=self._seed(group)).merge(sketch)
+                for group, sketch in self.daily.items()
+            }
+            for group, days in self.open_days.items():
+                if days:
+                    sketches.setdefault(
+                        group, KLLSketch(self.k, seed=self._seed(group))
+                    ).update([days[date] for date in sorted(days)])
+        else:
+            raise ValueError(f"Unknown metric: {metric}")
+
+        columns = ("Región", "Producto")
+        positions = [columns.index(column) for column in by]
+        merged: Dict[tuple, KLLSketch] = {}
+        for group in sorted(sketches):
+            key = tuple(group[position] for position in positions)
+            merged.setdefault(key, KLLSketch(self.k, seed=self._seed(key))).merge(
+                sketches[group]
+            )
+
+        output = []
+        for key in sorted(merged):
+            estimates = merged[key].quantiles(quantiles)
+            record = dict(zip(by, key))
+            for quantile, estimate in zip(quantiles, estimates):
+                record[f"p{round(quantile * 100):02d}"] = round(float(estimate), 2)
+            record["count"] = merged[key].count
+            output.append(record)
+        return output
+
+
+def build_sketches(sales_df: pd.DataFrame) -> SalesSketches:
+    """
+    Sketch a whole sales table at once.
+
+    Args:
+        sales_df (pd.DataFrame): Sales rows, as in `SalesSketches.update`.
+
+    Returns:
+        SalesSketches: The sketches, with every day closed.
+    """
+    return SalesSketches().update(sales_df).finalize()
+
+
+def _sketch_file(arguments: Tuple[str, int, int]) -> SalesSketches:
+    path, k, seed = arguments
+    return SalesSketches(k, seed).update(pd.read_parquet(path))
+
+
+def sketch_files(
+    paths: Iterable[str],
+    k: int = SKETCH_SIZE,
+    num_processes: Optional[int] = None,
+    seed: int = 0,
+) -> SalesSketches:
+    """
+    Build the sketches of several Parquet files in parallel and merge them.
+
+    Args:
+        paths (Iterable[str]): The files, e.g. the shards written by `prueba_acceso.py`.
+        k (int): Size of the compactors of each sketch.
+        num_processes (int, optional): Worker processes. Defaults to one per CPU.
+        seed (int): Seed of the compactions.
+
+    Returns:
+        SalesSketches: The merged sketches.
+    """
+    tasks = [(path, k, seed + position) for position, path in enumerate(paths)]
+    sketches = SalesSketches(k, seed)
+    with ProcessPoolExecutor(max_workers=num_processes) as executor:
+        for partial in executor.map(_sketch_file, tasks):
+            sketches.merge(partial)
+    return sketches.finalize()
+
+
+if __name__ == "__main__":
+    import argparse
+    import glob
+    import os
+
+    parser = argparse.ArgumentParser(
+        description="Print sales quantiles of a directory of Parquet files."
+    )
+    parser.add_argument("path", help="Directory of Parquet files")
+    parser.add_argument("--processes", type=int, default=None)
+    args = parser.parse_args()
+
+    sketches = sketch_files(
+        sorted(glob.glob(os.path.join(args.path, "*.parquet"))),
+        num_processes=args.processes,
+    )
+    for metric in ("tickets", "daily"):
+        print(metric)
+        for record in sketches.records(metric):
+            print(record)
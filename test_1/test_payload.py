@@ -0,0 +1,67 @@
+import pandas as pd
+import numpy as np
+
+import json
+
+import pytest
+
+from payload import ChartData, encode_payload
+
+
+@pytest.mark.parametrize("columnar", [False, True])
+def test_missing_values_are_null_on_every_path(columnar):
+    records = [
+        {"a": np.nan, "b": 1.5},
+        {"a": float("nan"), "b": np.float64(np.inf)},
+        {"a": np.float32(np.nan), "b": -np.inf},
+    ]
+    frame = pd.DataFrame(records)
+
+    bodies = [
+        encode_payload(data, columnar=columnar, gzip_threshold=None).body
+        for data in (records, frame, ChartData(frame))
+    ]
+
+    # Every body is valid JSON and the records and the DataFrame produce the same bytes
+    assert len(set(bodies)) == 1
+    decoded = json.loads(bodies[0])
+    if columnar:
+        assert decoded["data"] == {"a": [None, None, None], "b": [1.5, None, None]}
+    else:
+        assert decoded == [
+            {"a": None, "b": 1.5},
+            {"a": None, "b": None},
+            {"a": None, "b": None},
+        ]
+
+
+def test_nested_missing_values_are_null():
+    body = encode_payload({"value": np.nan, "data": [{"x": [1.0, np.nan]}]}).body
+    assert json.loads(body) == {"value": None, "data": [{"x": [1.0, None]}]}
+
+
+@pytest.mark.parametrize("columnar", [False, True])
+def test_datetimes_are_encoded_the_same_on_every_path(columnar):
+    stamps = [
+        pd.Timestamp("2023-01-01"),
+        pd.Timestamp("2023-01-02 08:30:00"),
+        pd.Timestamp("2023-01-03 08:30:00.250000"),
+        pd.NaT,
+    ]
+    records = [{"Fecha": stamp, "Ventas": 1.0} for stamp in stamps]
+    frame = pd.DataFrame(records)
+
+    bodies = [
+        encode_payload(data, columnar=columnar, gzip_threshold=None).body
+        for data in (records, frame, ChartData(frame))
+    ]
+
+    assert len(set(bodies)) == 1
+    decoded = json.loads(bodies[0])
+    fechas = decoded["data"]["Fecha"] if columnar else [r["Fecha"] for r in decoded]
+    assert fechas == [
+        "2023-01-01",
+        "2023-01-02T08:30:00",
+        "2023-01-03T08:30:00.250000",
+        None,
+    ]
@@ -0,0 +1,65 @@
+import pandas as pd
+
+import pytest
+
+from sketches import SalesSketches
+
+
+def sales_rows(*days):
+    return pd.DataFrame(
+        {
+            "Fecha": pd.to_datetime(list(days)),
+            "Región": "Madrid",
+            "Producto": "Producto A",
+            "Ventas": [10.0, 20.0, 30.0, 40.0][: len(days)],
+        }
+    )
+
+
+ROWS = sales_rows("2023-01-01", "2023-01-02", "2023-01-02", "2023-01-03")
+
+
+def daily_records(sketches):
+    return sketches.records("daily", quantiles=(0.0, 0.5, 1.0))
+
+
+def test_split_and_merged_equals_single_pass():
+    single = SalesSketches().update(ROWS)
+    split = (
+        SalesSketches()
+        .update(ROWS.iloc[:2])
+        .merge(SalesSketches().update(ROWS.iloc[2:]))
+    )
+
+    expected = [
+        {
+            "Región": "Madrid",
+            "Producto": "Producto A",
+            "p00": 10.0,
+            "p50": 40.0,
+            "p100": 50.0,
+            "count": 3,
+        }
+    ]
+    assert daily_records(single) == expected
+    assert daily_records(split) == expected
+    assert daily_records(split.finalize()) == expected
+
+
+def test_out_of_order_chunks_equal_single_pass():
+    shuffled = SalesSketches().update(ROWS.iloc[[2, 3]]).update(ROWS.iloc[[0, 1]])
+    assert daily_records(shuffled.finalize()) == daily_records(
+        SalesSketches().update(ROWS).finalize()
+    )
+
+
+def test_closed_days_reject_late_rows():
+    sketches = SalesSketches().update(ROWS.iloc[:2])
+    sketches.close_days(pd.Timestamp("2023-01-02"))
+    sketches.update(ROWS.iloc[2:])
+    assert daily_records(sketches)[0]["count"] == 3
+
+    with pytest.raises(ValueError):
+        sketches.update(ROWS.iloc[:1])
+    with pytest.raises(ValueError):
+        sketches.merge(SalesSketches().update(ROWS.iloc[:1]))
@@ -2,9 +2,137 @@ import pandas as pd
 import numpy as np
 
 import datetime
+import os
 from collections import defaultdict
 
-from typing import Dict, Any, List, Union, Tuple
+from typing import Dict, Any, List, Union, Tuple, Optional
+
+from kernels import VALUE_COLUMNS, factorize, grouped_sums
+from payload import ChartData
+from shared_cube import build_daily_cube, parallel_map, region_daily_totals
+
+# Label of the bucket that collects the categories left out of a top-K selection
+OTHER_LABEL = "Other"
+
+# Prediction of the rows without sales. Summed along with the sales, it lets the
+# functions that replace the sales of 0 by the prediction work on already summed rows.
+ZERO_SALES_PREDICTION = "Prediccion sin ventas"
+
+# Rows from which the daily sales by region are computed in worker processes. Starting
+# the pool costs more than the per-region work saves on smaller data: 30 to 80 ms on
+# 45 thousand to 6 million rows of 8 regions and 20 products.
+POOL_MIN_ROWS = 5_000_000
+
+
+def top_k_mask(totals: np.ndarray, k: Optional[int]) -> np.ndarray:
+    """
+    Select the k largest totals with a partial sort.
+
+    Args:
+        totals (np.ndarray): Total value of each category.
+        k (int, optional): Number of categories to keep. None keeps all of them.
+
+    Returns:
+        np.ndarray: Boolean mask, True for the categories to keep.
+    """
+    mask = np.ones(len(totals), dtype=bool)
+    if k is None or len(totals) <= k:
+        return mask
+
+    # argpartition places the k largest values last without sorting the rest
+    mask[:] = False
+    mask[np.argpartition(totals, len(totals) - k)[-k:]] = True
+    return mask
+
+
+def fold_totals_into_other(totals: pd.Series, k: Optional[int]) -> pd.Series:
+    """
+    Keep the k largest totals and sum the rest into an "Other" entry.
+
+    Args:
+        totals (pd.Series): Aggregated values indexed by category.
+        k (int, optional): Number of categories to keep. None keeps all of them.
+
+    Returns:
+        pd.Series: The kept totals, in their original order, plus the "Other" entry if any
+                   category was folded.
+    """
+    mask = top_k_mask(totals.to_numpy(), k)
+    if mask.all():
+        return totals
+
+    folded = pd.concat([totals[mask], pd.Series({OTHER_LABEL: totals[~mask].sum()})])
+    return folded.rename_axis(totals.index.name).rename(totals.name)
+
+
+def fold_labels_into_other(
+    labels: pd.Series, totals: pd.Series, k: Optional[int]
+) -> pd.Series:
+    """
+    Relabel every category outside the top k as "Other" before aggregating.
+
+    Args:
+        labels (pd.Series): Category column of the raw data.
+        totals (pd.Series): Total value of each category, used to rank them.
+        k (int, optional): Number of categories to keep. None keeps all of them.
+
+    Returns:
+        pd.Series: The relabelled category column.
+    """
+    mask = top_k_mask(totals.to_numpy(), k)
+    if mask.all():
+        return labels
+
+    keep = totals.index[mask]
+    if isinstance(labels.dtype, pd.CategoricalDtype):
+        # Dropped categories become NaN, which avoids a per-row comparison
+        return labels.cat.set_categories(list(keep) + [OTHER_LABEL]).fillna(OTHER_LABEL)
+    return labels.where(labels.isin(keep), OTHER_LABEL)
+
+
+def fold_series_into_other(
+    records: List[Dict[str, Any]], x: str, k: Optional[int]
+) -> List[Dict[str, Any]]:
+    """
+    Keep the k series with the largest totals in a list of chart records and sum the
+    rest into an "Other" series.
+
+    Args:
+        records (list): Chart records, each with the `x` key and one key per series.
+        x (str): The key of the x axis.
+        k (int, optional): Number of series to keep. None keeps all of them.
+
+    Returns:
+        list: The records with at most k + 1 series each.
+    """
+    if k is None:
+        return records
+
+    # Single pass over the records to get the total of each series
+    totals = defaultdict(float)
+    for record in records:
+        for key, value in record.items():
+            if key != x:
+                totals[key] += value
+
+    totals = pd.Series(totals, dtype="float64")
+    mask = top_k_mask(totals.to_numpy(), k)
+    if mask.all():
+        return records
+
+    keep = set(totals.index[mask])
+    folded_records = []
+    for record in records:
+        folded = {x: record[x]}
+        other = 0.0
+        for key, value in record.items():
+            if key in keep:
+                folded[key] = value
+            elif key != x:
+                other += value
+        folded[OTHER_LABEL] = other
+        folded_records.append(folded)
+    return folded_records
 
 
 def calculate_weeks(df):
@@ -42,12 +170,14 @@ def calculate_weeks(df):
 
 
 # Main functions
-def calculate_sales_by_day_of_the_week(sales_df: pd.DataFrame):
+def calculate_sales_by_day_of_the_week(sales_df: pd.DataFrame, columnar: bool = False):
     """
     Calculate sales data by day of the week for the given DataFrame.
 
     Args:
         sales_df (pd.DataFrame): The pandas DataFrame containing sales data.
+        columnar (bool): Return the sales by day of the week as a `ChartData` instead of
+                         a list of dictionaries.
 
     Returns:
         dict: A dictionary containing sales data by day of the week along with
@@ -65,9 +195,6 @@ def calculate_sales_by_day_of_the_week(sales_df: pd.DataFrame):
         end_date_last_week,
     ) = calculate_weeks(sales_df)
 
-    # List to store the output for each day of the week
-    output_list = []
-
     # Define the days of the week
     days_of_week = [
         "Monday",
@@ -79,34 +206,33 @@ def calculate_sales_by_day_of_the_week(sales_df: pd.DataFrame):
         "Sunday",
     ]
 
-    # Print the tail of the sales_df DataFrame to inspect the last 100 rows
-
-    for day in days_of_week:
-        # Filter data for this week and last week
-        filter_this_week = mask_this_week & (sales_df["Fecha"].dt.strftime("%A") == day)
-        filter_last_week = mask_last_week & (sales_df["Fecha"].dt.strftime("%A") == day)
-
-        df_this_week = sales_df.loc[filter_this_week]
-        df_last_week = sales_df.loc[filter_last_week]
-
-        # Calculate sales and predictions for this week and last week
-        sales_this_week = df_this_week["Ventas"].sum()
-        prediction_this_week = df_this_week["Prediccion"].sum()
-        sales_last_week = df_last_week["Ventas"].sum()
-        prediction_last_week = df_last_week["Prediccion"].sum()
-
-        # Create the dictionary for this day and append to the output list
-        day_data = {
-            "Day_of_Week": day,
-            "Sales this week": sales_this_week,
-            "Prediction this week": prediction_this_week,
-            "Sales last week": sales_last_week,
-            "Prediction last week": prediction_last_week,
-        }
-        output_list.append(day_data)
+    # Sum sales and predictions by weekday (0 is Monday) for this week and last week
+    weekday = pd.Series(
+        pd.Categorical(
+            sales_df["Fecha"].dt.weekday, categories=range(len(days_of_week))
+        )
+    )
+    totals_this_week, totals_last_week = (
+        grouped_sums([weekday], sales_df[VALUE_COLUMNS], mask=mask, observed=False)
+        for mask in (mask_this_week, mask_last_week)
+    )
+
+    # One row per day, the records are only built when they are published
+    days_data = ChartData(
+        pd.DataFrame(
+            {
+                "Day_of_Week": days_of_week,
+                "Sales this week": totals_this_week["Ventas"].to_numpy(),
+                "Prediction this week": totals_this_week["Prediccion"].to_numpy(),
+                "Sales last week": totals_last_week["Ventas"].to_numpy(),
+                "Prediction last week": totals_last_week["Prediccion"].to_numpy(),
+            }
+        ),
+        x="Day_of_Week",
+    )
 
     return {
-        "days_data": output_list,
+        "days_data": days_data if columnar else days_data.to_records(),
         "start_date": start_date.strftime("%d%m%Y"),
         "end_date": end_date.strftime("%d%m%Y"),
         "start_date_last_week": start_date_last_week.strftime("%d-%m-%Y"),
@@ -114,7 +240,9 @@ def calculate_sales_by_day_of_the_week(sales_df: pd.DataFrame):
     }
 
 
-def calculate_data_indicators(df: pd.DataFrame) -> List[Dict[str, Any]]:
+def calculate_data_indicators(
+    df: pd.DataFrame, columnar: bool = False
+) -> Union[List[Dict[str, Any]], ChartData]:
     """
     Calculate and visualize the total sales for the current week using indicators.
 
@@ -125,6 +253,10 @@ def calculate_data_indicators(df: pd.DataFrame) -> List[Dict[str, Any]]:
     Args:
         df (pd.DataFrame): The input dataframe, which should include 'Fecha', 'Ventas',
                            'Prediccion', and 'Producto' columns. 'Fecha' should be of datetime type.
+                           Rows summed by day may carry the `ZERO_SALES_PREDICTION` of
+                           the rows they sum instead of having rows of 0 sales.
+        columnar (bool): Return the indicators as a `ChartData` instead of a list of
+                         dictionaries.
 
     Returns:
         list: A list of dictionaries, each containing the data for one indicator.
@@ -134,27 +266,23 @@ def calculate_data_indicators(df: pd.DataFrame) -> List[Dict[str, Any]]:
     df["Fecha"] = pd.to_datetime(df["Fecha"])
 
     # Replace the sales of 0 by the prediction on future dates
-    mask_future_dates_and_zero_sales = (df["Fecha"] > pd.to_datetime("today")) & (
-        df["Ventas"] == 0
-    )
-    df.loc[mask_future_dates_and_zero_sales, "Ventas"] = df.loc[
-        mask_future_dates_and_zero_sales, "Prediccion"
-    ]
+    mask_future_dates = df["Fecha"] > pd.to_datetime("today")
+    if ZERO_SALES_PREDICTION in df:
+        df.loc[mask_future_dates, "Ventas"] += df.loc[
+            mask_future_dates, ZERO_SALES_PREDICTION
+        ]
+    else:
+        mask_future_dates_and_zero_sales = mask_future_dates & (df["Ventas"] == 0)
+        df.loc[mask_future_dates_and_zero_sales, "Ventas"] = df.loc[
+            mask_future_dates_and_zero_sales, "Prediccion"
+        ]
 
     # Calculate the mask for this week
     mask_this_week, _, _, _, _, _ = calculate_weeks(df)
 
     # Calculate the sales and predictions per product for the current week
-    sales_this_week_per_product = (
-        df.loc[mask_this_week].groupby("Producto")["Ventas"].sum()
-    )
-    predictions_this_week_per_product = (
-        df.loc[mask_this_week].groupby("Producto")["Prediccion"].sum()
-    )
-
-    # Combine the data into a single DataFrame
-    sales_comparison = pd.concat(
-        [sales_this_week_per_product, predictions_this_week_per_product], axis=1
+    sales_comparison = grouped_sums(
+        [df["Producto"]], df[VALUE_COLUMNS], mask=mask_this_week
     )
     sales_comparison.columns = ["Ventas Semana Actual", "Prediccion Semana Actual"]
 
@@ -162,32 +290,26 @@ def calculate_data_indicators(df: pd.DataFrame) -> List[Dict[str, Any]]:
     sales_comparison = sales_comparison.reset_index()
     sales_comparison = sales_comparison.fillna(0)
 
-    # Create the list of indicators for visualization
-    data_indicator = []
-
-    for idx, row in sales_comparison.iterrows():
-        indicator = {}
-        indicator["description"] = row["Producto"]
-        indicator["title"] = "Difference to match prediccion"
-        indicator["value"] = (
-            row["Ventas Semana Actual"] - row["Prediccion Semana Actual"]
+    # One indicator per product, red if actual sales are less than predictions and green
+    # if they are equal to or greater than predictions
+    ventas = sales_comparison["Ventas Semana Actual"]
+    prediccion = sales_comparison["Prediccion Semana Actual"]
+    data_indicator = ChartData(
+        pd.DataFrame(
+            {
+                "description": sales_comparison["Producto"],
+                "title": "Difference to match prediccion",
+                "value": ventas - prediccion,
+                "color": np.where(ventas < prediccion, "error", "success"),
+            }
         )
-
-        if row["Ventas Semana Actual"] < row["Prediccion Semana Actual"]:
-            indicator[
-                "color"
-            ] = "error"  # Red if actual sales are less than predictions
-        else:
-            indicator[
-                "color"
-            ] = "success"  # Green if actual sales are equal to or greater than predictions
-        data_indicator.append(indicator)
-    return data_indicator
+    )
+    return data_indicator if columnar else data_indicator.to_records()
 
 
 def calculate_sales_percentage_by_region(
-    sales_df: pd.DataFrame,
-) -> List[Dict[str, Union[str, float]]]:
+    sales_df: pd.DataFrame, top_k: Optional[int] = None, columnar: bool = False
+) -> Union[List[Dict[str, Union[str, float]]], ChartData]:
     """
     Calculate and visualize the percentage of sales by region as a pie chart.
 
@@ -197,6 +319,10 @@ def calculate_sales_percentage_by_region(
 
     Args:
         sales_df (pd.DataFrame): The sales data DataFrame. It should have 'Región' and 'Ventas' columns.
+        top_k (int, optional): Maximum number of regions to show. The remaining regions are
+                               summed into an "Other" slice. None shows every region.
+        columnar (bool): Return the slices as a `ChartData` instead of a list of
+                         dictionaries.
 
     Returns:
         list: A list of dictionaries, where each dictionary has two keys: 'Región' representing
@@ -204,7 +330,10 @@ def calculate_sales_percentage_by_region(
               for that region.
     """
     # Group the sales data by region and calculate the total sales for each region
-    sales_by_region = sales_df.groupby("Región")["Ventas"].sum().reset_index()
+    sales_by_region = grouped_sums([sales_df["Región"]], sales_df[["Ventas"]])["Ventas"]
+
+    # Bound the number of slices, folding the smallest regions into "Other"
+    sales_by_region = fold_totals_into_other(sales_by_region, top_k).reset_index()
 
     # Calculate the total sales across all regions
     total_sales = sales_df["Ventas"].sum()
@@ -216,73 +345,95 @@ def calculate_sales_percentage_by_region(
 
     # Convert the DataFrame to a list of dictionaries, including only the region and the percentage
     # Each dictionary corresponds to a data entry for visualization
-    return sales_by_region[["Región", "Percentage"]].to_dict("records")
+    slices = ChartData(
+        sales_by_region[["Región", "Percentage"]], names="Región", values="Percentage"
+    )
+    return slices if columnar else slices.to_records()
 
 
 def calculate_sales_by_month(
-    sales_df: pd.DataFrame,
-) -> Dict[str, Union[List[Dict[str, Union[str, float]]], int]]:
+    sales_df: pd.DataFrame, top_k: Optional[int] = None, columnar: bool = False
+) -> Dict[str, Union[List[Dict[str, Union[str, float]]], ChartData, int]]:
     """
     Calculate the total sales for each product by month and consider predictions if available.
 
     Args:
-        sales_df (pd.DataFrame): The pandas DataFrame containing sales data.
+        sales_df (pd.DataFrame): The pandas DataFrame containing sales data. Rows summed
+                                 by day or month may carry the `ZERO_SALES_PREDICTION`
+                                 of the rows they sum.
+        top_k (int, optional): Maximum number of product series. The remaining products are
+                               summed into an "Other" series. None keeps every product.
+        columnar (bool): Return the monthly sales as a `ChartData` instead of a list of
+                         dictionaries.
 
     Returns:
-        Dict[str, Union[List[Dict[str, Union[str, float]]], int]]: A dictionary containing two keys:
+        Dict[str, Union[List[Dict[str, Union[str, float]]], int]]: A dictionary containing four keys:
             - 'data': A list of dictionaries, each containing 'Fecha' (date in 'YYYY-MM' format)
                      and sales data for each product.
             - 'num_predictions': The number of predictions that match actual sales data.
+            - 'num_months': The number of months in 'data'.
+            - 'num_months_to_date': The number of months up to the current one.
     """
 
     # Convert 'Fecha' column to datetime data type
     sales_df["Fecha"] = pd.to_datetime(sales_df["Fecha"])
 
     # Replace 'Ventas' equal to 0 with 'Prediccion' values
-    sales_df["Ventas"] = np.where(
-        sales_df["Ventas"] == 0, sales_df["Prediccion"], sales_df["Ventas"]
-    )
+    if ZERO_SALES_PREDICTION in sales_df:
+        sales_df["Ventas"] += sales_df[ZERO_SALES_PREDICTION]
+    else:
+        sales_df["Ventas"] = np.where(
+            sales_df["Ventas"] == 0, sales_df["Prediccion"], sales_df["Ventas"]
+        )
+
+    # Bound the number of series, folding the smallest products into "Other"
+    if top_k is not None:
+        sales_df["Producto"] = fold_labels_into_other(
+            sales_df["Producto"],
+            grouped_sums([sales_df["Producto"]], sales_df[["Ventas"]])["Ventas"],
+            top_k,
+        )
 
     # Aggregate the data by month and product, summing up the sales and predictions
-    sales_df = (
-        sales_df.groupby([pd.Grouper(key="Fecha", freq="M"), "Producto"])
-        .agg({"Ventas": "sum", "Prediccion": "sum"})
-        .reset_index()
-    )
+    month = sales_df["Fecha"].dt.to_period("M")
+    _, products = factorize(sales_df["Producto"])
+    sales_df = grouped_sums(
+        [month, sales_df["Producto"]], sales_df[VALUE_COLUMNS]
+    ).reset_index()
+
+    # Label each month by its last day
+    sales_df["Fecha"] = sales_df["Fecha"].dt.to_timestamp(how="end").dt.normalize()
 
     # Calculate the number of predictions that match actual sales data
     num_predictions = len(sales_df[sales_df["Ventas"] != sales_df["Prediccion"]])
 
-    # Drop the 'Prediccion' column as it is no longer needed
-    sales_df.drop(columns=["Prediccion"], inplace=True)
-
-    # Group data by 'Fecha' and create dictionaries for each unique date
-    data_list = []
-    for fecha, group_data in sales_df.groupby("Fecha"):
-        # Create a dictionary for each date
-        date_dict = {"Fecha": fecha.date()}
-        # Add sales data for each product on that date
-        for _, row in group_data.iterrows():
-            date_dict[row["Producto"]] = row["Ventas"]
-        # Append the dictionary to the data_list
-        data_list.append(date_dict)
-
-    # Get the current year and month
-    current_year = datetime.date.today().year
-    current_month = datetime.date.today().month
-
-    # Initialize a counter for future values
-    future_values_count = 0
+    # One row per month and one column per product. Products without sales in a month
+    # are left out of the record of that month. The products keep the order of the groups,
+    # which is the order of the categories for categorical products.
+    monthly_sales = sales_df.pivot(index="Fecha", columns="Producto", values="Ventas")
+    monthly_sales = monthly_sales[
+        products.intersection(monthly_sales.columns, sort=False)
+    ]
+    monthly_sales.columns.name = None
+    data = ChartData(
+        monthly_sales.reset_index().assign(Fecha=lambda frame: frame["Fecha"].dt.date),
+        drop_missing=True,
+        x="Fecha",
+    )
 
-    # Loop through the list of dictionaries to count future dates
-    for item in data_list:
-        fecha = item.get("Fecha")
-        if fecha.year > current_year or (
-            fecha.year == current_year and fecha.month > current_month
-        ):
-            future_values_count += 1
+    # Count the months after the current one
+    future_values_count = int(
+        (
+            monthly_sales.index.to_period("M") > pd.Period(datetime.date.today(), "M")
+        ).sum()
+    )
 
-    return {"data": data_list, "num_predictions": future_values_count}
+    return {
+        "data": data if columnar else data.to_records(),
+        "num_predictions": future_values_count,
+        "num_months": len(monthly_sales),
+        "num_months_to_date": len(monthly_sales) - future_values_count,
+    }
 
 
 def calculate_sales_per_month(sales_df: pd.DataFrame) -> pd.DataFrame:
@@ -308,7 +459,9 @@ def calculate_sales_per_month(sales_df: pd.DataFrame) -> pd.DataFrame:
     sales_df["Month"] = sales_df["Fecha"].dt.month_name()
 
     # Group data by year and month, calculate total sales
-    sales_per_month = sales_df.groupby(["Year", "Month"])["Ventas"].sum().reset_index()
+    sales_per_month = grouped_sums(
+        [sales_df["Year"], sales_df["Month"]], sales_df[["Ventas"]]
+    ).reset_index()
 
     # Pivot the DataFrame: months as index, years as columns, and sales as values
     pivot_sales = sales_per_month.pivot(index="Month", columns="Year", values="Ventas")
@@ -350,73 +503,156 @@ def calculate_sales_per_month(sales_df: pd.DataFrame) -> pd.DataFrame:
     return pivot_sales
 
 
-def calculate_sale_by_region_group_by_date(df: pd.DataFrame):
+class WeeklyProductSales:
     """
-    Process the dataframe by region, filtering out future dates and storing the sales data.
+    Weekly sales of each product, as shown on the weekly bars of every region.
+
+    The rows up to today are taken region by region, in row order within each region, and
+    the sales of a product in a week are those of its last row. Only the last row of each
+    region, week and product is kept, so the bars of a subset of the regions are computed
+    from this state with `select`, without going back to the rows.
+    """
+
+    def __init__(self, regions: List[Any], cells: pd.DataFrame, products: pd.DataFrame):
+        # The regions in group-by order, every one of them gets the bars
+        self.regions = regions
+        # One row per region, week and product with the 'Ventas' and the position of the
+        # last row, and the position of the first row of the region in that week
+        self.cells = cells
+        # The position of the first row of each region and product, future rows included
+        self.products = products
+
+    def select(self, regions: List[Any]) -> "WeeklyProductSales":
+        """
+        Keep some regions, as if only their rows had been given.
+
+        Args:
+            regions (List[Any]): The regions to keep.
+
+        Returns:
+            WeeklyProductSales: The state of those regions.
+        """
+        present = set(self.products["Región"])
+        kept = [
+            region for region in self.regions if region in regions and region in present
+        ]
+        return WeeklyProductSales(
+            kept,
+            self.cells[self.cells["Región"].isin(kept)],
+            self.products[self.products["Región"].isin(kept)],
+        )
+
+    def records(self, top_k: Optional[int] = None) -> Dict[Any, List[Dict[str, Any]]]:
+        """
+        Build the weekly bars.
+
+        Args:
+            top_k (int, optional): Maximum number of product series. The remaining
+                                   products are summed into an "Other" series. None keeps
+                                   every product.
+
+        Returns:
+            dict: The records of each region, one per week with its 'date' and the sales
+                  of every product.
+        """
+        rank = {region: position for position, region in enumerate(self.regions)}
+        cells = self.cells.assign(rank=self.cells["Región"].map(rank).astype("int64"))
+
+        # The last region wins, then the last row within it
+        last = cells.sort_values(["rank", "position"]).drop_duplicates(
+            ["week", "Producto"], keep="last"
+        )
+        weeks = pd.Index(
+            cells.sort_values(["rank", "week_position"])
+            .drop_duplicates("week")["week"]
+            .to_numpy()
+        )
+        products = pd.Index(
+            self.products.groupby("Producto", observed=True, sort=False)["position"]
+            .min()
+            .sort_values()
+            .index.tolist()
+        )
+
+        sales = np.zeros((len(weeks), len(products)))
+        sales[
+            weeks.get_indexer(last["week"]), products.get_indexer(last["Producto"])
+        ] = last["Ventas"].to_numpy(dtype="float64")
+        records = fold_series_into_other(
+            [
+                {"date": week.date(), **dict(zip(products, week_sales))}
+                for week, week_sales in zip(weeks, sales.tolist())
+            ],
+            "date",
+            top_k,
+        )
+        return {region: records for region in self.regions}
+
+
+def build_weekly_product_sales(df: pd.DataFrame) -> WeeklyProductSales:
+    """
+    Keep the last row of each region, week and product of the sales data.
 
     Args:
         df (pandas.DataFrame): Input dataframe containing sales data.
 
     Returns:
-        list: List of dictionaries containing the processed sales data for each week.
+        WeeklyProductSales: The state behind the weekly bars.
     """
+    if isinstance(df["Región"].dtype, pd.CategoricalDtype):
+        regions = df["Región"].cat.categories.tolist()
+    else:
+        regions = sorted(df["Región"].dropna().unique())
+
+    fecha = pd.to_datetime(df["Fecha"])
+    rows = pd.DataFrame(
+        {
+            "Región": df["Región"].to_numpy(),
+            "week": fecha.dt.to_period("W").dt.start_time.to_numpy(),
+            "Producto": df["Producto"].to_numpy(),
+            "position": np.arange(len(df)),
+        }
+    ).dropna(subset=["Región"])
+    products = (
+        rows.groupby(["Región", "Producto"], sort=False)["position"].min().reset_index()
+    )
 
-    data = []
-
-    # Unique products in the dataframe
-    unique_products = df["Producto"].unique()
-
-    # Group the dataframe by region
-    grouped_df = df.groupby("Región")
-
-    # Get the current date
-    current_date = datetime.date.today()
-
-    region_data = {}
-
-    # Iterate over the groups
-    for region, group in grouped_df:
-        # Iterate over the rows in the group
-        for index, row in group.iterrows():
-            date = row["Fecha"].strftime("%Y-%m-%d")
-            ventas = float(row["Ventas"])
-
-            # Check if the date is valid (before or equal to the current date)
-            if datetime.datetime.strptime(date, "%Y-%m-%d").date() <= current_date:
-                # Check if the data for the current week already exists in 'data' list
-                week_start_date = pd.to_datetime(date).to_period("W").start_time.date()
-                existing_data = next(
-                    (d for d in data if d["start_date"] == week_start_date), None
-                )
-
-                if existing_data:
-                    existing_data[row["Producto"]] = ventas
-                else:
-                    product_data = {"start_date": week_start_date}
-                    for prod in unique_products:
-                        product_data[prod] = 0 if prod != row["Producto"] else ventas
-                    data.append(product_data)
-
-        # Assign the region's data to the dictionary
-        region_data[region] = data
-
-    for i in region_data:
-        # Create a dictionary to store the sum of sales for each product per week
-        sum_sales_by_week = defaultdict(lambda: defaultdict(float))
-
-        # Iterate through the data and sum the sales for each product per week
-        for record in region_data[i]:
-            start_date = record["start_date"]
-            for product, sales in record.items():
-                if product != "start_date":
-                    sum_sales_by_week[start_date][product] += sales
-
-        region_data[i] = [
-            {"date": start_date, **sales_data}
-            for start_date, sales_data in sum_sales_by_week.items()
-        ]
+    # Only the sales up to today are shown
+    today = pd.Timestamp(datetime.date.today())
+    rows = rows[fecha.dt.normalize().to_numpy()[rows.index] <= today]
+    cells = (
+        rows.groupby(["Región", "week", "Producto"], sort=False)["position"]
+        .max()
+        .reset_index()
+    )
+    cells["Ventas"] = df["Ventas"].to_numpy()[cells["position"].to_numpy()]
+    cells["week_position"] = (
+        rows.groupby(["Región", "week"], sort=False)["position"]
+        .min()
+        .reindex(pd.MultiIndex.from_frame(cells[["Región", "week"]]))
+        .to_numpy()
+    )
+    return WeeklyProductSales(regions, cells, products)
 
-    return region_data
+
+def calculate_sale_by_region_group_by_date(
+    df: pd.DataFrame, top_k: Optional[int] = None
+):
+    """
+    Process the dataframe by region, filtering out future dates and storing the sales data.
+
+    Every region gets the weekly bars of all the regions, see `WeeklyProductSales`.
+
+    Args:
+        df (pandas.DataFrame): Input dataframe containing sales data.
+        top_k (int, optional): Maximum number of product series per region. The remaining
+                               products are summed into an "Other" series. None keeps
+                               every product.
+
+    Returns:
+        dict: The list of dictionaries with the sales data of each week, by region.
+    """
+    return build_weekly_product_sales(df).records(top_k)
 
 
 def calculate_this_last_week_sales_vs_prediction(df: pd.DataFrame):
@@ -468,23 +704,14 @@ def calculate_this_last_week_sales_vs_prediction(df: pd.DataFrame):
         end_date_last_week,
     ) = calculate_weeks(df)
 
-    # Filter the data for this week and last week
-    data_this_week = df[mask_this_week]
-    data_last_week = df[mask_last_week]
-
-    # Group the data by 'Región' and 'Producto' and calculate the sum of 'Ventas' and 'Prediccion' for each combination
-    ventas_this_week_by_region = data_this_week.groupby(["Región", "Producto"])[
-        "Ventas"
-    ].sum()
-    prediccion_this_week_by_region = data_this_week.groupby(["Región", "Producto"])[
-        "Prediccion"
-    ].sum()
-    ventas_last_week_by_region = data_last_week.groupby(["Región", "Producto"])[
-        "Ventas"
-    ].sum()
-    prediccion_last_week_by_region = data_last_week.groupby(["Región", "Producto"])[
-        "Prediccion"
-    ].sum()
+    # Group the data of this week and last week by 'Región' and 'Producto' and calculate the sum of 'Ventas' and 'Prediccion' for each combination
+    keys = [df["Región"], df["Producto"]]
+    this_week_by_region = grouped_sums(keys, df[VALUE_COLUMNS], mask=mask_this_week)
+    last_week_by_region = grouped_sums(keys, df[VALUE_COLUMNS], mask=mask_last_week)
+    ventas_this_week_by_region = this_week_by_region["Ventas"]
+    prediccion_this_week_by_region = this_week_by_region["Prediccion"]
+    ventas_last_week_by_region = last_week_by_region["Ventas"]
+    prediccion_last_week_by_region = last_week_by_region["Prediccion"]
 
     # Create dictionaries for each week with regions as keys
     this_week_data_by_region = {
@@ -535,3 +762,150 @@ def calculate_this_last_week_sales_vs_prediction(df: pd.DataFrame):
     this_week_data_by_region["End Date Last Week"] = end_date_last_week
 
     return this_week_data_by_region
+
+
+def calculate_sales_vs_prediction_gauges(
+    df: pd.DataFrame,
+) -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """
+    Prepare the gauges comparing the sales of this week and last week to the prediction.
+
+    Args:
+        df (pandas.DataFrame): The input DataFrame containing sales and prediction data.
+
+    Returns:
+        dict: For each region, a 'Last week' and a 'This week' gauge, each with its
+              'value' (the sales as a percentage of the prediction, see
+              `calculate_this_last_week_sales_vs_prediction`), its 'color' ('success'
+              from 100 on, 'error' below) and its 'description' (the dates of the week).
+    """
+    weeks = calculate_this_last_week_sales_vs_prediction(df)
+    descriptions = {
+        "Last week": (
+            f"Sales from {weeks['Start Date Last Week']:%d/%m/%Y} "
+            f"to {weeks['End Date Last Week']:%d/%m/%Y}"
+        ),
+        "This week": (
+            f"Sales from {weeks['Start Date']:%d/%m/%Y} to {weeks['End Date']:%d/%m/%Y}"
+        ),
+    }
+
+    gauges = {}
+    for region, region_weeks in weeks.items():
+        # The other keys are the dates of the weeks
+        if not isinstance(region_weeks, dict):
+            continue
+        gauges[region] = {
+            week: {
+                "value": region_weeks[week]["Percentage"],
+                "color": "success"
+                if region_weeks[week]["Percentage"] >= 100
+                else "error",
+                "description": description,
+            }
+            for week, description in descriptions.items()
+        }
+    return gauges
+
+
+def calculate_daily_sales_by_region(
+    sales_df: pd.DataFrame, processes: Optional[int] = None, columnar: bool = False
+) -> Dict[str, Union[List[Dict[str, Any]], ChartData]]:
+    """
+    Calculate the daily sales and predictions of each region.
+
+    The data is reduced to a daily region x product cube in shared memory. On large data
+    the regions are computed in worker processes, which read the cube without a copy of
+    the sales data (see `shared_cube.py`).
+
+    Args:
+        sales_df (pd.DataFrame): The sales data, or its rows summed by day, region and
+                                 product.
+        processes (int, optional): Number of worker processes. By default, one per CPU
+                                   from `POOL_MIN_ROWS` rows on a machine with several
+                                   CPUs, and none below. 1 computes every region in
+                                   this process.
+        columnar (bool): Return each region's data as a `ChartData` instead of a list of
+                         dictionaries.
+
+    Returns:
+        dict: By region, one record per day with 'Fecha', 'Ventas' and 'Prediccion'. The
+              sales after today are left out, the predictions are kept. Empty when there
+              are no rows.
+    """
+    if sales_df.empty:
+        return {}
+    if processes is None and (
+        len(sales_df) < POOL_MIN_ROWS or (os.cpu_count() or 1) < 2
+    ):
+        processes = 1
+
+    with build_daily_cube(sales_df) as cube:
+        regions = cube.handle.regions
+        if processes == 1:
+            totals = [region_daily_totals(cube, index) for index in range(len(regions))]
+        else:
+            totals = parallel_map(
+                cube, region_daily_totals, range(len(regions)), processes
+            )
+
+    today = pd.Timestamp(datetime.date.today())
+    region_sales = {}
+    for region, daily in zip(regions, totals):
+        daily["Ventas"] = daily["Ventas"].where(daily["Fecha"] <= today)
+        data = ChartData(
+            daily.assign(Fecha=daily["Fecha"].dt.date), drop_missing=True, x="Fecha"
+        )
+        region_sales[region] = data if columnar else data.to_records()
+    return region_sales
+
+
+def _benchmark(num_days: int = 1500, num_products: int = 200):
+    from payload import measure_allocations, to_records
+    from prueba_acceso import generar_shard_ventas
+
+    today = pd.Timestamp(datetime.date.today())
+    sales_df = generar_shard_ventas(
+        today - pd.Timedelta(days=num_days),
+        num_dias=num_days,
+        num_productos=num_products,
+        num_regiones=20,
+        semilla=np.random.SeedSequence(0),
+    ).fillna(0)
+
+    cases = {
+        "calculate_sales_by_day_of_the_week": calculate_sales_by_day_of_the_week,
+        "calculate_data_indicators": calculate_data_indicators,
+        "calculate_sales_percentage_by_region": calculate_sales_percentage_by_region,
+        "calculate_sales_by_month": calculate_sales_by_month,
+    }
+
+    def publish(result):
+        if isinstance(result, dict):
+            return {key: to_records(value) for key, value in result.items()}
+        return to_records(result)
+
+    print(f"{len(sales_df)} rows, KiB allocated by tracemalloc")
+    for name, function in cases.items():
+        # Warm up, so that lazily built caches are not counted against one of the paths
+        function(sales_df.copy())
+        records_df, columnar_df = sales_df.copy(), sales_df.copy()
+        records, records_peak, records_kept = measure_allocations(
+            lambda: function(records_df)
+        )
+        chart, columnar_peak, columnar_kept = measure_allocations(
+            lambda: function(columnar_df, columnar=True)
+        )
+        published, publish_peak, _ = measure_allocations(lambda: publish(chart))
+        assert published == records
+        print(
+            f"{name}: records peak {records_peak / 1024:.0f}, "
+            f"kept {records_kept / 1024:.0f} | "
+            f"columnar peak {columnar_peak / 1024:.0f}, "
+            f"kept {columnar_kept / 1024:.0f}, "
+            f"publish peak {publish_peak / 1024:.0f}"
+        )
+
+
+if __name__ == "__main__":
+    _benchmark()
@@ -0,0 +1,80 @@
+import pandas as pd
+
+from typing import Any, Callable, Dict, NamedTuple, Optional, Tuple
+
+from utils import (
+    POSITIVE_SALES,
+    calculate_monthly_rollup,
+    plot_data_from_rollup,
+    monthly_sales_from_rollup,
+    cumulative_monthly_sales_from_rollup,
+    calculate_rolling_sales_metrics,
+)
+
+
+class Aggregation(NamedTuple):
+    """
+    What a `calculate_*` function needs from the sales data.
+
+    The functions only sum 'Ventas' and 'Prediccion', so they return the same result when
+    they are given the data already summed by their group-by keys at their time grain
+    (or any finer one), after applying their row filter. A grain of None means that the
+    function needs the rows themselves, it is given the filtered rows without summing.
+
+    When `prepare` is set, the function is given its result instead of the scanned data.
+    It is computed once per scan and shared by every function with the same `prepare`.
+
+    `window` marks the functions that only look at last week and this week, they are
+    given the rows of that window when they are loaded on their own. `columnar` marks the
+    functions that can keep their result as `ChartData` until it is published.
+    """
+
+    function: Callable[..., Any]
+    grain: Optional[str]
+    columns: Callable[[dict], Tuple[str, ...]]
+    filter: Optional[str]
+    prepare: Optional[Callable[[pd.DataFrame], Any]] = None
+    window: bool = False
+    columnar: bool = True
+
+
+# Columns added to the rows before every scan, summed along with 'Ventas' and
+# 'Prediccion'. The positive sales stand for the 'Ventas > 0' filter, so the monthly
+# charts do not need a scan of their own.
+DERIVED_VALUES: Dict[str, Callable[[pd.DataFrame], pd.Series]] = {
+    POSITIVE_SALES: lambda frame: frame["Ventas"].clip(lower=0),
+}
+
+# Columns summed by every scan
+SCAN_VALUES = ["Ventas", POSITIVE_SALES, "Prediccion"]
+
+# The monthly charts are all derived from one monthly rollup by product
+AGGREGATIONS = {
+    "calculate_generate_plot_data": Aggregation(
+        plot_data_from_rollup,
+        "M",
+        lambda args: ("Producto",),
+        None,
+        calculate_monthly_rollup,
+    ),
+    "calculate_monthly_sales": Aggregation(
+        monthly_sales_from_rollup,
+        "M",
+        lambda args: ("Producto",),
+        None,
+        calculate_monthly_rollup,
+    ),
+    "calculate_cumulative_monthly_sales": Aggregation(
+        cumulative_monthly_sales_from_rollup,
+        "M",
+        lambda args: ("Producto",),
+        None,
+        calculate_monthly_rollup,
+    ),
+    "calculate_rolling_sales_metrics": Aggregation(
+        calculate_rolling_sales_metrics,
+        "D",
+        lambda args: (args.get("by", "Región"),),
+        None,
+    ),
+}
@@ -0,0 +1,232 @@
+import json
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+from payload import encode_payload
+
+# Trace files can be shared by the clients of several threads, e.g. in a fan-out
+_trace_lock = threading.Lock()
+
+
+class FakeShimokuError(Exception):
+    """Error injected by the fake client."""
+
+
+class Client:
+    """
+    Local stand-in for `shimoku_api_python.Client` that records the calls instead of
+    sending them.
+
+    Every call sleeps for the configured latency, fails with `FakeShimokuError` at the
+    configured error rate and is recorded in `calls` with the encoded size of its payload.
+    The calls are also appended to a JSON lines trace file when one is configured.
+    Missing arguments, indicators fed with shared data and references to shared data
+    sets that were not set in the menu path raise the errors the SDK would.
+
+    The defaults of the injection settings are read from the environment:
+    SHIMOKU_FAKE_LATENCY (seconds per call), SHIMOKU_FAKE_JITTER (extra random seconds,
+    up to this value), SHIMOKU_FAKE_ERROR_RATE (0 to 1) and SHIMOKU_FAKE_TRACE (path).
+    """
+
+    def __init__(
+        self,
+        access_token: Optional[str] = None,
+        universe_id: Optional[str] = None,
+        latency: Optional[float] = None,
+        jitter: Optional[float] = None,
+        error_rate: Optional[float] = None,
+        trace_path: Optional[str] = None,
+        seed: Optional[int] = None,
+        **kwargs,
+    ):
+        self.latency = _setting(latency, "SHIMOKU_FAKE_LATENCY", 0.0)
+        self.jitter = _setting(jitter, "SHIMOKU_FAKE_JITTER", 0.0)
+        self.error_rate = _setting(error_rate, "SHIMOKU_FAKE_ERROR_RATE", 0.0)
+        self.trace_path = trace_path or os.getenv("SHIMOKU_FAKE_TRACE")
+        self._random = random.Random(seed)
+        self._start = time.perf_counter()
+
+        self.calls: List[Dict[str, Any]] = []
+        self.workspace: Optional[str] = None
+        self.board: Optional[str] = None
+        self.menu_path: Optional[str] = None
+        self.tabs: Optional[tuple] = None
+        self.shared_data: Dict[tuple, int] = {}
+        self.plt = _FakePlot(self)
+
+    def _call(
+        self,
+        method: str,
+        data: Any = None,
+        shared: Optional[Dict[str, Any]] = None,
+        **arguments,
+    ):
+        """Record a call, after its injected latency and error."""
+        record: Dict[str, Any] = {
+            "seq": len(self.calls),
+            "at": round(time.perf_counter() - self._start, 6),
+            "method": method,
+            "board": self.board,
+            "menu_path": self.menu_path,
+            "tabs": list(self.tabs) if self.tabs else None,
+            "arguments": {
+                name: value
+                for name, value in arguments.items()
+                if isinstance(value, (str, int, float, bool, type(None)))
+            },
+            "rows": 0,
+            "payload_bytes": 0,
+        }
+        if isinstance(data, str):
+            # A reference to a shared data set is not uploaded again
+            record["shared_data"] = data
+            record["shared_bytes"] = self.shared_data[(self.menu_path, data)]
+        elif data is not None:
+            encoded = encode_payload(data)
+            record["rows"] = encoded.rows
+            record["payload_bytes"] = encoded.size
+        shared_sizes = {}
+        for name, shared_set in (shared or {}).items():
+            encoded = encode_payload(shared_set)
+            shared_sizes[name] = encoded.size
+            record["rows"] += encoded.rows
+            record["payload_bytes"] += encoded.size
+
+        delay = self.latency + self._random.uniform(0, self.jitter)
+        time.sleep(delay)
+        record["latency_seconds"] = round(delay, 6)
+        failed = self._random.random() < self.error_rate
+        record["error"] = f"Injected error in {method}" if failed else None
+
+        self.calls.append(record)
+        if self.trace_path:
+            with _trace_lock, open(self.trace_path, "a", encoding="utf-8") as trace:
+                trace.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        if failed:
+            raise FakeShimokuError(record["error"])
+        for name, size in shared_sizes.items():
+            self.shared_data[(self.menu_path, name)] = size
+
+    def set_workspace(self, uuid: Optional[str] = None, name: Optional[str] = None):
+        self._call("set_workspace", uuid=uuid, name=name)
+        self.workspace = uuid or name
+
+    def set_board(self, name: str):
+        self._call("set_board", name=name)
+        self.board = name
+
+    def set_menu_path(self, name: str, sub_path: Optional[str] = None):
+        self._call("set_menu_path", name=name, sub_path=sub_path)
+        self.menu_path = name
+        self.tabs = None
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Summarize the recorded calls.
+
+        Returns:
+            dict: The number of calls and errors, the payload bytes, the bytes saved by
+                  referencing shared data sets by name instead of uploading them again,
+                  the injected seconds, the calls per second and the same counts by
+                  method.
+        """
+        by_method: Dict[str, Dict[str, Any]] = defaultdict(
+            lambda: {"calls": 0, "errors": 0, "payload_bytes": 0}
+        )
+        for record in self.calls:
+            method = by_method[record["method"]]
+            method["calls"] += 1
+            method["errors"] += record["error"] is not None
+            method["payload_bytes"] += record["payload_bytes"]
+
+        elapsed = time.perf_counter() - self._start
+        return {
+            "calls": len(self.calls),
+            "errors": sum(record["error"] is not None for record in self.calls),
+            "payload_bytes": sum(record["payload_bytes"] for record in self.calls),
+            # Every reference but the first to a shared data set avoided an upload
+            "bytes_saved": sum(record.get("shared_bytes", 0) for record in self.calls)
+            - sum(
+                {
+                    (record["menu_path"], record["shared_data"]): record["shared_bytes"]
+                    for record in self.calls
+                    if "shared_data" in record
+                }.values()
+            ),
+            "latency_seconds": round(
+                sum(record["latency_seconds"] for record in self.calls), 6
+            ),
+            "calls_per_second": round(len(self.calls) / elapsed, 3) if elapsed else 0.0,
+            "by_method": dict(by_method),
+        }
+
+
+class _FakePlot:
+    """Stand-in for `Client.plt` with the chart and tabs methods used by the dashboards."""
+
+    def __init__(self, client: Client):
+        self._client = client
+
+    def _chart(self, method: str, data: Any, order: int, **arguments):
+        if isinstance(data, str) and (
+            (self._client.menu_path, data) not in self._client.shared_data
+        ):
+            raise ValueError(f"Shared data '{data}' was not set in this menu path")
+        self._client._call(method, data=data, order=order, **arguments)
+
+    def line(self, data: Any, order: int, x: str, **arguments):
+        self._chart("line", data, order, x=x, **arguments)
+
+    def bar(self, data: Any, order: int, x: str, **arguments):
+        self._chart("bar", data, order, x=x, **arguments)
+
+    def stacked_bar(self, data: Any, order: int, x: str, **arguments):
+        self._chart("stacked_bar", data, order, x=x, **arguments)
+
+    def predictive_line(self, data: Any, order: int, x: str, **arguments):
+        self._chart("predictive_line", data, order, x=x, **arguments)
+
+    def pie(self, data: Any, order: int, names: str, values: str, **arguments):
+        self._chart("pie", data, order, names=names, values=values, **arguments)
+
+    def indicator(self, data: Any, order: int, **arguments):
+        if isinstance(data, str):
+            raise TypeError("Indicators do not accept shared data")
+        self._chart("indicator", data, order, **arguments)
+
+    def gauge_indicator(self, order: int, value: float, **arguments):
+        self._client._call("gauge_indicator", order=order, value=value, **arguments)
+
+    def html(self, html: str, order: int, **arguments):
+        self._client._call("html", data=[{"html": html}], order=order, **arguments)
+
+    def set_shared_data(self, dfs: Dict[str, Any]):
+        self._client._call("set_shared_data", shared=dfs, names=", ".join(dfs))
+
+    def set_tabs_index(
+        self, tabs_index: tuple, order: Optional[int] = None, **arguments
+    ):
+        self._client._call(
+            "set_tabs_index", group=tabs_index[0], tab=tabs_index[1], order=order
+        )
+        self._client.tabs = tuple(tabs_index)
+
+    def change_current_tab(self, tab: str):
+        if self._client.tabs is None:
+            raise RuntimeError("No tabs group is set")
+        self._client._call("change_current_tab", tab=tab)
+        self._client.tabs = (self._client.tabs[0], tab)
+
+    def pop_out_of_tabs_group(self):
+        self._client._call("pop_out_of_tabs_group")
+        self._client.tabs = None
+
+
+def _setting(value: Optional[float], variable: str, default: float) -> float:
+    if value is not None:
+        return value
+    return float(os.getenv(variable) or default)
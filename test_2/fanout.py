@@ -0,0 +1,113 @@
+import json
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+
+def load_boards(path: str) -> Dict[str, List[str]]:
+    """
+    Load the board to regions mapping of a fan-out.
+
+    Parameters:
+        path (str): JSON file such as {"Rodrigo Torres": ["Región 1", "Región 2"]}.
+
+    Returns:
+        dict: The regions shown on each board, by board name.
+    """
+    with open(path, encoding="utf-8") as boards_file:
+        return json.load(boards_file)
+
+
+@contextmanager
+def timed(timings: Dict[str, float], stage: str):
+    """Record the seconds spent in a stage of a board."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = round(time.perf_counter() - start, 6)
+
+
+def publish_boards(
+    boards: Dict[str, List[str]],
+    publish_board: Callable[[str, List[str], Dict[str, float]], Any],
+    max_workers: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Publish every board concurrently, a failing board does not stop the others.
+
+    Parameters:
+        boards (dict): The regions shown on each board, by board name.
+        publish_board (Callable): Publishes one board, called with its name, its regions
+                                  and a dictionary to record the seconds of its stages
+                                  with `timed`.
+        max_workers (int, optional): Boards published at the same time. Defaults to 8.
+
+    Returns:
+        list: One report per board, in the order of `boards`, with 'board', 'regions',
+              'seconds', 'stages' and 'error' (None when the board was published).
+    """
+
+    def run(board: str) -> Dict[str, Any]:
+        timings: Dict[str, float] = {}
+        start = time.perf_counter()
+        try:
+            publish_board(board, boards[board], timings)
+            error = None
+        except Exception:
+            error = traceback.format_exc()
+        return {
+            "board": board,
+            "regions": boards[board],
+            "seconds": round(time.perf_counter() - start, 6),
+            "stages": timings,
+            "error": error,
+        }
+
+    if not boards:
+        return []
+    with ThreadPoolExecutor(max_workers=max_workers or min(8, len(boards))) as executor:
+        return list(executor.map(run, boards))
+
+
+def format_report(reports: List[Dict[str, Any]], compute_seconds: float) -> str:
+    """
+    Summarize a fan-out as a table with the timings of every board.
+
+    Parameters:
+        reports (list): The reports returned by `publish_boards`.
+        compute_seconds (float): Seconds spent computing the shared aggregates.
+
+    Returns:
+        str: The report, one line per board followed by the errors.
+    """
+    stages = list(
+        dict.fromkeys(stage for report in reports for stage in report["stages"])
+    )
+    failed = [report for report in reports if report["error"]]
+    lines = [
+        f"Shared aggregates computed once in {compute_seconds:.3f} s",
+        " | ".join(["board", "status", "total s"] + [f"{stage} s" for stage in stages]),
+    ]
+    for report in reports:
+        lines.append(
+            " | ".join(
+                [
+                    report["board"],
+                    "failed" if report["error"] else "ok",
+                    f"{report['seconds']:.3f}",
+                ]
+                + [
+                    f"{report['stages'][stage]:.3f}"
+                    if stage in report["stages"]
+                    else "-"
+                    for stage in stages
+                ]
+            )
+        )
+    lines.append(f"{len(reports) - len(failed)} of {len(reports)} boards published")
+    for report in failed:
+        lines.append(f"\n{report['board']} failed:\n{report['error']}")
+    return "\n".join(lines)
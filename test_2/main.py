@@ -1,18 +1,42 @@
-import shimoku_api_python as Shimoku
-
+import argparse
+import json
+import time
 from dotenv import load_dotenv
 from os import getenv
 
+from fanout import load_boards, timed, publish_boards, format_report
+from planner import load_spec, explain, execute_plan, execute_fanout, publish
 from prueba_acceso import generar_datos_ventas
-from utils import (
-    calculate_generate_plot_data,
-    calculate_monthly_sales,
-    calculate_cumulative_monthly_sales,
+from publisher import DedupPublisher
+
+parser = argparse.ArgumentParser(description="Publish the sales dashboard to Shimoku.")
+parser.add_argument(
+    "--spec", default="dashboard.json", help="Dashboard spec, JSON or YAML"
+)
+parser.add_argument(
+    "--explain", action="store_true", help="Print the fused plan and exit"
 )
+parser.add_argument(
+    "--boards",
+    help="JSON mapping of board names to regions, publishes one board per entry",
+)
+args = parser.parse_args()
+
+# Load the dashboard spec: the layout and the function that feeds each dataset
+spec = load_spec(args.spec)
+if args.explain:
+    print(explain(spec))
+    raise SystemExit(0)
 
 # Load environment variables
 load_dotenv()
 
+# SHIMOKU_FAKE publishes to a local client that records the calls, see fake_shimoku.py
+if getenv("SHIMOKU_FAKE"):
+    import fake_shimoku as Shimoku
+else:
+    import shimoku_api_python as Shimoku
+
 # Generate dummmy sales data
 df = generar_datos_ventas(1000)
 df = df.fillna(0)
@@ -22,63 +46,49 @@ access_token = getenv("SHIMOKU_TOKEN")
 universe_id: str = getenv("UNIVERSE_ID")
 workspace_id: str = getenv("WORKSPACE_ID")
 
-s = Shimoku.Client(
-    access_token=access_token,
-    universe_id=universe_id,
-)
-s.set_workspace(uuid=workspace_id)
-s.set_board("Rodrigo Torres")
 
+def build_publisher(board: str) -> DedupPublisher:
+    # Identical data sets are uploaded once and shared between charts on flush
+    s = DedupPublisher(
+        Shimoku.Client(
+            access_token=access_token,
+            universe_id=universe_id,
+        )
+    )
+    s.set_workspace(uuid=workspace_id)
+    s.set_board(board)
+    return s
 
-plot1_data = calculate_generate_plot_data(df.copy())
-monthly_sales = calculate_monthly_sales(df.copy())
-cumulative_monthly_sales = calculate_cumulative_monthly_sales(df.copy())
 
+if args.boards:
+    # Fan-out: compute the scans once and publish every board from its own thread
+    boards = load_boards(args.boards)
+    start = time.perf_counter()
+    board_results = execute_fanout(spec, df, boards)
+    compute_seconds = time.perf_counter() - start
 
-# Task 1
-s.set_menu_path("Prueba-v2", "Daily Sales")
-s.plt.html(
-    html=(f"<h1>The following plots contain the same information</h1>"),
-    order=0,
-)
-s.plt.html(
-    html=(f"<h3>Product sales by month</h3>"),
-    order=1,
-)
-s.plt.bar(data=plot1_data, order=2, x="Fecha", y_axis_name="Sales ($)")
-s.plt.line(
-    data=plot1_data,
-    order=3,
-    x="Fecha",
-    rows_size=3,
-    cols_size=6,
-    y_axis_name="Sales ($)",
-)
-s.plt.stacked_bar(
-    data=plot1_data,
-    order=4,
-    x="Fecha",
-    rows_size=3,
-    cols_size=6,
-    y_axis_name="Sales ($)",
-)
+    def publish_board(board, regions, timings):
+        with timed(timings, "connect"):
+            s = build_publisher(board)
+        with timed(timings, "publish"):
+            publish(spec, board_results[board], s)
+            s.flush()
 
-# Task 2
-s.set_menu_path("Prueba-v2", "Sales")
+    print(format_report(publish_boards(boards, publish_board), compute_seconds))
+    raise SystemExit(0)
 
-s.plt.set_tabs_index(("Charts", "Montly"), order=0)
-s.plt.bar(
-    data=monthly_sales,
-    order=0,
-    x="Fecha",
-    y_axis_name="Sales ($)",
-)
+# Compute every dataset with the minimal set of scans
+results = execute_plan(spec, df)
 
-s.plt.change_current_tab("Accumulated")
-s.plt.bar(
-    x="Fecha",
-    order=0,
-    data=cumulative_monthly_sales,
-    y_axis_name="Sales ($)",
+# Lay out the charts and publish the queued plots
+s = build_publisher(spec["board"])
+publish(spec, results, s)
+publish_stats = s.flush()
+print(
+    f"Published {publish_stats['charts']} charts: "
+    f"{publish_stats['bytes_uploaded']} bytes uploaded, "
+    f"{publish_stats['bytes_saved']} bytes saved by "
+    f"{publish_stats['shared_datasets']} shared data sets"
 )
-s.plt.pop_out_of_tabs_group()
+if getenv("SHIMOKU_FAKE"):
+    print(json.dumps(s.summary(), indent=2))
@@ -0,0 +1,265 @@
+import pandas as pd
+import numpy as np
+
+import datetime
+import gzip
+import json
+import math
+import tracemalloc
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+# Bodies of at least this many bytes are gzip compressed
+GZIP_THRESHOLD = 8 * 1024
+
+
+class ChartData:
+    """
+    Columnar chart data, converted to the records expected by the client only when needed.
+
+    The calculations keep their result as a DataFrame, one row per record, instead of
+    building a dictionary per row. `to_records` converts it once and caches the records,
+    so the charts and boards that publish the same data share them.
+
+    Parameters:
+        frame (pd.DataFrame): One row per record and one column per key.
+        drop_missing (bool): Leave the missing values out of the records, for series that
+                             do not have a value on every point of the x axis.
+        **metadata: Chart metadata kept with the data, e.g. the x axis column.
+    """
+
+    def __init__(self, frame: pd.DataFrame, drop_missing: bool = False, **metadata):
+        self.frame = frame
+        self.drop_missing = drop_missing
+        self.metadata = metadata
+        self._records: Optional[List[dict]] = None
+
+    def to_records(self) -> List[dict]:
+        """
+        Convert the data to a list of dictionaries, only the first time it is called.
+
+        Returns:
+            list: One dictionary per row, with native Python values.
+        """
+        if self._records is None:
+            records = self.frame.to_dict("records")
+            if self.drop_missing:
+                records = [
+                    {key: value for key, value in record.items() if not pd.isna(value)}
+                    for record in records
+                ]
+            self._records = records
+        return self._records
+
+    def __len__(self) -> int:
+        return len(self.frame)
+
+
+def to_records(data: Any) -> Any:
+    """
+    Convert chart data to the shape expected by the client, right before publishing it.
+
+    Parameters:
+        data (Any): A `ChartData` or a payload that is already a list or a DataFrame.
+
+    Returns:
+        Any: The records of a `ChartData`, any other payload unchanged.
+    """
+    if isinstance(data, ChartData):
+        return data.to_records()
+    return data
+
+
+class EncodedPayload(NamedTuple):
+    body: bytes
+    content_encoding: Optional[str]
+    rows: int
+    raw_size: int
+
+    @property
+    def size(self) -> int:
+        return len(self.body)
+
+
+def _format_datetime(value: pd.Timestamp) -> str:
+    """Format a date at midnight as 'YYYY-MM-DD' and any other time in ISO 8601."""
+    if value == value.normalize():
+        return value.strftime("%Y-%m-%d")
+    return value.isoformat()
+
+
+def _encode_scalar(value: Any) -> Any:
+    """Convert a numpy or pandas scalar to the equivalent JSON value."""
+    if isinstance(value, np.integer):
+        return int(value)
+    if isinstance(value, np.floating):
+        return _finite(float(value))
+    if isinstance(value, np.bool_):
+        return bool(value)
+    # NaT is a datetime too, it is checked first
+    if value is pd.NaT:
+        return None
+    if isinstance(value, datetime.datetime):
+        return _format_datetime(pd.Timestamp(value))
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _finite(value: Any) -> Any:
+    """
+    Replace NaN and infinite floats with None, in nested lists and dictionaries too.
+
+    `float` and `np.float64` values are serialized by the encoder itself, without going
+    through `_encode_scalar`, so they are normalized before encoding.
+    """
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {key: _finite(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_finite(item) for item in value]
+    return value
+
+
+# allow_nan=False raises instead of writing NaN or Infinity, which are not valid JSON
+_encoder = json.JSONEncoder(
+    default=_encode_scalar, separators=(",", ":"), ensure_ascii=False, allow_nan=False
+)
+
+
+def _encode_column(column: pd.Series) -> list:
+    """Convert a whole column to JSON values with vectorized operations."""
+    if pd.api.types.is_datetime64_any_dtype(column):
+        # Value by value as in `_format_datetime`, the records of the same chart are
+        # encoded the same whether they come from a DataFrame or from dictionaries
+        text = column.dt.strftime("%Y-%m-%d").astype(object)
+        timed = column.notna() & (column != column.dt.normalize())
+        if timed.any():
+            text[timed] = column[timed].map(_format_datetime)
+        return text.where(column.notna(), None).tolist()
+    if pd.api.types.is_float_dtype(column):
+        finite = np.isfinite(column.to_numpy(dtype="float64", na_value=np.nan))
+        return column.astype(object).where(finite, None).tolist()
+    if pd.api.types.is_numeric_dtype(column) or pd.api.types.is_bool_dtype(column):
+        # numpy's tolist already produces native Python scalars
+        return column.to_numpy().tolist()
+    return _finite(column.tolist())
+
+
+def to_columns(data: Any) -> Dict[str, list]:
+    """
+    Convert a chart payload to a dictionary of JSON ready columns.
+
+    Parameters:
+        data (Any): A list of dictionaries, a DataFrame or a `ChartData`.
+
+    Returns:
+        dict: One list of values per column, in the order of the payload.
+    """
+    if isinstance(data, ChartData):
+        data = data.frame
+    if isinstance(data, pd.DataFrame):
+        return {str(name): _encode_column(data[name]) for name in data.columns}
+
+    # Records are transposed directly, numpy and date values are left to the encoder
+    names = list(dict.fromkeys(key for record in data for key in record))
+    return {str(name): _finite([record.get(name) for record in data]) for name in names}
+
+
+def encode_payload(
+    data: Any, columnar: bool = False, gzip_threshold: int = GZIP_THRESHOLD
+) -> EncodedPayload:
+    """
+    Serialize a chart payload to compact JSON, optionally columnar and gzip compressed.
+
+    numpy scalars, `pd.Timestamp`, `datetime.date` and NaN values are converted natively
+    instead of going through `str`, NaN and infinite values are encoded as null on both
+    the records and the DataFrame paths. Dates at midnight are encoded as 'YYYY-MM-DD'
+    and other times in ISO 8601, value by value, on both paths too.
+
+    Parameters:
+        data (Any): A list of dictionaries, a dictionary, a DataFrame or a `ChartData`.
+        columnar (bool): Encode as {"columns": [...], "data": {column: [values]}} instead
+                         of repeating the keys on every record.
+        gzip_threshold (int): Minimum size, in bytes, to compress the body. None disables
+                              the compression.
+
+    Returns:
+        EncodedPayload: The body, its content encoding ('gzip' or None), the number of
+                        rows and the size before compression.
+    """
+    if columnar:
+        columns = to_columns(data)
+        rows = len(next(iter(columns.values()), []))
+        body = _encoder.encode({"columns": list(columns), "data": columns})
+    else:
+        # The records of a ChartData are cached, they are encoded as they are published
+        data = to_records(data)
+        if isinstance(data, pd.DataFrame):
+            # Convert column by column, then rebuild the records from native values
+            columns = to_columns(data)
+            data = [dict(zip(columns, row)) for row in zip(*columns.values())]
+        else:
+            data = _finite(data)
+        rows = len(data) if isinstance(data, list) else 1
+        body = _encoder.encode(data)
+
+    raw = body.encode("utf-8")
+    # A fixed mtime keeps the compressed body deterministic, so it can be hashed
+    if gzip_threshold is not None and len(raw) >= gzip_threshold:
+        return EncodedPayload(
+            gzip.compress(raw, compresslevel=6, mtime=0), "gzip", rows, len(raw)
+        )
+    return EncodedPayload(raw, None, rows, len(raw))
+
+
+def payload_report(payloads: Dict[str, Any], columnar: bool = False) -> List[dict]:
+    """
+    Measure the encoded size of each chart payload.
+
+    Parameters:
+        payloads (dict): Chart name to payload.
+        columnar (bool): Measure the columnar encoding.
+
+    Returns:
+        list: One dictionary per chart with 'chart', 'rows', 'raw_bytes', 'encoded_bytes'
+              and 'content_encoding'.
+    """
+    report = []
+    for chart, data in payloads.items():
+        encoded = encode_payload(data, columnar=columnar)
+        report.append(
+            {
+                "chart": chart,
+                "rows": encoded.rows,
+                "raw_bytes": encoded.raw_size,
+                "encoded_bytes": encoded.size,
+                "content_encoding": encoded.content_encoding,
+            }
+        )
+    return report
+
+
+def measure_allocations(function: Callable[[], Any]) -> Tuple[Any, int, int]:
+    """
+    Measure the memory allocated by a call with tracemalloc.
+
+    Parameters:
+        function (Callable): The call to measure, without arguments.
+
+    Returns:
+        tuple: The result of the call, the peak bytes allocated during the call and the
+               bytes still allocated after it, which are mostly held by the result.
+    """
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    start, _ = tracemalloc.get_traced_memory()
+    result = function()
+    current, peak = tracemalloc.get_traced_memory()
+    if not tracing:
+        tracemalloc.stop()
+    return result, peak - start, current - start
@@ -0,0 +1,102 @@
+import hashlib
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from payload import encode_payload
+
+# Chart methods whose `data` argument can be the name of a shared data set
+SHARED_DATA_CHARTS = {"bar", "line", "stacked_bar", "pie", "predictive_line"}
+
+
+class _DeferredPlot:
+    """Stand-in for `client.plt` that queues the calls until the publisher is flushed."""
+
+    def __init__(self, publisher: "DedupPublisher"):
+        self._publisher = publisher
+
+    def __getattr__(self, name: str):
+        def deferred_call(*args, **kwargs):
+            self._publisher._queue.append(("plt", name, args, kwargs))
+
+        return deferred_call
+
+
+class DedupPublisher:
+    """
+    Wrapper around a Shimoku client that uploads every distinct data set once.
+
+    Menu path changes and `plt` calls are queued. When `flush` is called, the data sets used
+    by more than one chart of the same menu path are uploaded once with
+    `plt.set_shared_data` and every chart references them by name. Any other attribute
+    is forwarded to the wrapped client straight away, e.g. `set_workspace` or `set_board`.
+    """
+
+    def __init__(self, client: Any):
+        self.client = client
+        self.plt = _DeferredPlot(self)
+        self._queue: List[Tuple[str, str, tuple, dict]] = []
+        self.stats = {
+            "charts": 0,
+            "shared_datasets": 0,
+            "bytes_uploaded": 0,
+            "bytes_saved": 0,
+        }
+
+    def __getattr__(self, name: str):
+        return getattr(self.client, name)
+
+    def set_menu_path(self, name: str, sub_path: Optional[str] = None):
+        self._queue.append(("client", "set_menu_path", (name, sub_path), {}))
+
+    def _scoped_queue(self) -> List[Tuple[Any, str, tuple, dict, Optional[tuple]]]:
+        """Attach to every queued chart the (menu path, content hash, size) of its data."""
+        scoped = []
+        menu_path = None
+        for target, name, args, kwargs in self._queue:
+            if target == "client" and name == "set_menu_path":
+                # Data sets belong to the menu path, its sub paths can share them
+                menu_path = args[0]
+            data_key = None
+            data = kwargs.get("data")
+            if name in SHARED_DATA_CHARTS and data is not None:
+                if not isinstance(data, str):
+                    encoded = encode_payload(data)
+                    digest = hashlib.sha256(encoded.body).hexdigest()
+                    data_key = (menu_path, digest, encoded.size)
+            scoped.append((target, name, args, kwargs, data_key))
+        return scoped
+
+    def flush(self) -> Dict[str, int]:
+        """
+        Publish the queued calls in order, uploading repeated data sets once.
+
+        Returns:
+            dict: The publishing stats: number of charts, shared data sets, and the bytes
+                  uploaded and saved by reusing data sets.
+        """
+        scoped = self._scoped_queue()
+        self._queue = []
+        uses = Counter(data_key for *_, data_key in scoped if data_key)
+        shared: Dict[tuple, str] = {}
+
+        for target, name, args, kwargs, data_key in scoped:
+            owner = self.client if target == "client" else self.client.plt
+            if data_key:
+                self.stats["charts"] += 1
+                _, digest, size = data_key
+                if uses[data_key] > 1:
+                    if data_key not in shared:
+                        shared[data_key] = f"shared-{digest[:16]}"
+                        self.client.plt.set_shared_data(
+                            dfs={shared[data_key]: kwargs["data"]}
+                        )
+                        self.stats["shared_datasets"] += 1
+                        self.stats["bytes_uploaded"] += size
+                    else:
+                        self.stats["bytes_saved"] += size
+                    kwargs = {**kwargs, "data": shared[data_key]}
+                else:
+                    self.stats["bytes_uploaded"] += size
+            getattr(owner, name)(*args, **kwargs)
+
+        return self.stats
@@ -0,0 +1,32 @@
+import fake_shimoku
+from publisher import DedupPublisher
+
+MONTHLY_SALES = [
+    {"Fecha": "2023-01", "Producto A": 120.0, "Producto B": 80.0},
+    {"Fecha": "2023-02", "Producto A": 95.5, "Producto B": 101.0},
+]
+
+
+def test_repeated_data_is_uploaded_once(monkeypatch):
+    monkeypatch.delenv("SHIMOKU_FAKE_TRACE", raising=False)
+    client = fake_shimoku.Client(latency=0, jitter=0, error_rate=0)
+    publisher = DedupPublisher(client)
+
+    publisher.set_menu_path("Prueba-v2", "Monthly Sales")
+    publisher.plt.bar(data=MONTHLY_SALES, order=0, x="Fecha")
+    publisher.plt.line(
+        data=[dict(record) for record in MONTHLY_SALES], order=1, x="Fecha"
+    )
+    stats = publisher.flush()
+
+    uploads = [call for call in client.calls if call["payload_bytes"]]
+    charts = [call for call in client.calls if call["method"] in ("bar", "line")]
+    # The data is uploaded once as a shared data set, both charts reference it
+    assert [call["method"] for call in uploads] == ["set_shared_data"]
+    assert [call["payload_bytes"] for call in charts] == [0, 0]
+    assert charts[0]["shared_data"] == charts[1]["shared_data"]
+
+    assert stats["shared_datasets"] == 1
+    assert stats["bytes_saved"] > 0
+    assert stats["bytes_saved"] == uploads[0]["payload_bytes"]
+    assert stats["bytes_saved"] == client.summary()["bytes_saved"]
@@ -1,110 +1,381 @@
 import pandas as pd
+import numpy as np
 import datetime as dt
 
+from typing import Optional, Union
 
-def calculate_generate_plot_data(df: pd.DataFrame) -> list:
+from payload import ChartData
+
+# Label of the bucket that collects the categories left out of a top-K selection
+OTHER_LABEL = "Other"
+
+# Column of the monthly rollup with the sum of the positive sales only
+POSITIVE_SALES = "Ventas positivas"
+
+
+def top_k_mask(totals: np.ndarray, k: Optional[int]) -> np.ndarray:
     """
-    Create a dictionary to store the sum of sales for each product per month.
+    Select the k largest totals with a partial sort.
 
     Parameters:
-        df (pd.DataFrame): DataFrame containing sales data, with columns 'Fecha' (Date) and 'Ventas' (Sales).
+        totals (np.ndarray): Total value of each category.
+        k (int, optional): Number of categories to keep. None keeps all of them.
 
     Returns:
-        list: A list of dictionaries containing the sum of sales for each product per month, in the format:
-              [{'Fecha': 'YYYY-MM', 'Product1': sum_sales1, 'Product2': sum_sales2, ...}, ...]
+        np.ndarray: Boolean mask, True for the categories to keep.
     """
-    # Convert the 'Fecha' column to datetime data type
-    df["Fecha"] = pd.to_datetime(df["Fecha"])
+    mask = np.ones(len(totals), dtype=bool)
+    if k is None or len(totals) <= k:
+        return mask
 
-    # Group by month and product, and sum the sales
-    monthly_sales = (
-        df[df["Ventas"] > 0]
-        .groupby([pd.Grouper(key="Fecha", freq="M"), "Producto"])
-        .agg({"Ventas": "sum"})
-        .unstack(fill_value=0)
-    )
+    # argpartition places the k largest values last without sorting the rest
+    mask[:] = False
+    mask[np.argpartition(totals, len(totals) - k)[-k:]] = True
+    return mask
 
-    # Reset index to convert the DataFrame into a list of dictionaries
-    monthly_sales = monthly_sales.reset_index()
 
-    # Convert the DataFrame to a list of dictionaries
-    data = monthly_sales.to_dict(orient="records")
+def fold_labels_into_other(
+    labels: pd.Series, totals: pd.Series, k: Optional[int]
+) -> pd.Series:
+    """
+    Relabel every category outside the top k as "Other" before aggregating.
+
+    Parameters:
+        labels (pd.Series): Category column of the raw data.
+        totals (pd.Series): Total value of each category, used to rank them.
+        k (int, optional): Number of categories to keep. None keeps all of them.
 
-    # Convert the list of dictionaries to the desired output format
-    output_data = []
-    for record in data:
-        record_dict = {"Fecha": record[("Fecha", "")]}
-        for key, value in record.items():
-            if isinstance(key, tuple) and key[0] == "Ventas":
-                record_dict[key[1]] = value
-        output_data.append(record_dict)
+    Returns:
+        pd.Series: The relabelled category column.
+    """
+    mask = top_k_mask(totals.to_numpy(), k)
+    if mask.all():
+        return labels
 
-    return output_data
+    keep = totals.index[mask]
+    if isinstance(labels.dtype, pd.CategoricalDtype):
+        # Dropped categories become NaN, which avoids a per-row comparison
+        return labels.cat.set_categories(list(keep) + [OTHER_LABEL]).fillna(OTHER_LABEL)
+    return labels.where(labels.isin(keep), OTHER_LABEL)
 
 
-def calculate_monthly_sales(df: pd.DataFrame) -> list:
+def calculate_monthly_rollup(df: pd.DataFrame) -> pd.DataFrame:
     """
-    Calculate monthly sales and return the data in a list of dictionaries.
+    Sum the sales of every month and product in a single scan.
+
+    The monthly charts are all derived from this rollup. Besides the total sales, it keeps
+    the sum of the positive sales only, which stands for filtering the rows with
+    'Ventas' > 0 before grouping.
 
     Parameters:
-        df (pd.DataFrame): DataFrame with sales data, containing a 'Date' column and a 'Sales' column.
+        df (pd.DataFrame): DataFrame with sales data, containing 'Fecha', 'Producto' and
+                           'Ventas' columns. Data already summed by day or month, with a
+                           'Ventas positivas' column, can be rolled up again.
 
     Returns:
-        list: A list of dictionaries with the total monthly sales and dates in 'YYYY-MM-DD' format.
+        pd.DataFrame: 'Ventas' and 'Ventas positivas' indexed by 'Fecha', the last day of
+                      the month, and 'Producto'. Only the months and products with rows
+                      are included.
     """
-    # Ensure 'Date' is of type datetime
-    df["Fecha"] = pd.to_datetime(df["Fecha"])
+    ventas = df["Ventas"]
+    if POSITIVE_SALES in df:
+        positive = df[POSITIVE_SALES]
+    else:
+        positive = ventas.where(ventas > 0, 0)
 
-    # Group the data by month and sum the sales for each month
-    monthly_totals = (
-        df.groupby(pd.Grouper(key="Fecha", freq="M"))["Ventas"].sum().reset_index()
+    # Truncate the dates to the month with numpy, without going through periods
+    month = pd.to_datetime(df["Fecha"]).to_numpy().astype("datetime64[M]")
+    rollup = (
+        pd.DataFrame({"Ventas": ventas.to_numpy(), POSITIVE_SALES: positive.to_numpy()})
+        .groupby([month, df["Producto"].reset_index(drop=True)], observed=True)
+        .sum()
     )
 
-    # Remove records with zero sales for future dates
-    today = pd.Timestamp(dt.date.today())
-    monthly_totals = monthly_totals[monthly_totals["Fecha"] <= today]
+    # Label every month by its last day, as pd.Grouper(freq="M") does
+    month_end = (rollup.index.levels[0].to_numpy().astype("datetime64[M]") + 1).astype(
+        "datetime64[D]"
+    ) - 1
+    rollup.index = rollup.index.set_levels(
+        [pd.DatetimeIndex(month_end.astype("datetime64[ns]"))], level=[0]
+    ).set_names(["Fecha", "Producto"])
+    return rollup
+
+
+def plot_data_from_rollup(
+    rollup: pd.DataFrame, top_k: Optional[int] = None, columnar: bool = False
+) -> Union[list, ChartData]:
+    """
+    Derive the positive sales of each product per month from the monthly rollup.
+
+    Parameters:
+        rollup (pd.DataFrame): The result of `calculate_monthly_rollup`.
+        top_k (int, optional): Maximum number of product series. The remaining products are
+                               summed into an "Other" series. None keeps every product.
+        columnar (bool): Return a `ChartData` instead of a list of dictionaries.
+
+    Returns:
+        list: The records of `calculate_generate_plot_data`.
+    """
+    # Months and products with positive sales, as if filtered by 'Ventas' > 0
+    positive = rollup.loc[rollup[POSITIVE_SALES] > 0, POSITIVE_SALES]
+
+    # Bound the number of series, folding the smallest products into "Other"
+    if top_k is not None:
+        products = positive.index.get_level_values("Producto").to_series(index=None)
+        totals = positive.groupby(level="Producto", observed=True).sum().sort_index()
+        folded = fold_labels_into_other(products, totals, top_k)
+        positive = positive.groupby(
+            [positive.index.get_level_values("Fecha"), folded.array], observed=True
+        ).sum()
+
+    # Categorical products are sorted in the order of their categories
+    monthly_sales = positive.unstack(fill_value=0).sort_index(axis=1)
+    monthly_sales.columns.name = None
+    chart = ChartData(monthly_sales.reset_index(), x="Fecha")
+    return chart if columnar else chart.to_records()
+
+
+def monthly_sales_from_rollup(
+    rollup: pd.DataFrame, columnar: bool = False
+) -> Union[list, ChartData]:
+    """
+    Derive the total sales of every month up to today from the monthly rollup.
+
+    Parameters:
+        rollup (pd.DataFrame): The result of `calculate_monthly_rollup`.
+        columnar (bool): Return a `ChartData` instead of a list of dictionaries.
+
+    Returns:
+        list: The records of `calculate_monthly_sales`.
+    """
+    monthly_totals = rollup["Ventas"].groupby(level="Fecha").sum()
+    if monthly_totals.empty:
+        monthly_totals = pd.DataFrame(columns=["Fecha", "Ventas"])
+    else:
+        # Months without any row are reported with zero sales
+        months = pd.date_range(
+            monthly_totals.index.min(),
+            monthly_totals.index.max(),
+            freq="M",
+            name="Fecha",
+        )
+        monthly_totals = monthly_totals.reindex(months, fill_value=0).reset_index()
+
+        # Remove records with zero sales for future dates
+        today = pd.Timestamp(dt.date.today())
+        monthly_totals = monthly_totals[monthly_totals["Fecha"] <= today]
+
+    chart = ChartData(monthly_totals, x="Fecha")
+    return chart if columnar else chart.to_records()
+
+
+def cumulative_monthly_sales_from_rollup(
+    rollup: pd.DataFrame, columnar: bool = False
+) -> Union[list, ChartData]:
+    """
+    Derive the cumulative positive sales per month from the monthly rollup.
+
+    Parameters:
+        rollup (pd.DataFrame): The result of `calculate_monthly_rollup`.
+        columnar (bool): Return a `ChartData` instead of a list of dictionaries.
+
+    Returns:
+        list: The records of `calculate_cumulative_monthly_sales`.
+    """
+    # Only sales greater than 0 are accumulated, to avoid zero accumulation in the future
+    monthly_totals = rollup[POSITIVE_SALES].groupby(level="Fecha").sum()
+    monthly_totals = monthly_totals[monthly_totals > 0]
+    if monthly_totals.empty:
+        cumulative_sales = pd.DataFrame(columns=["Fecha", "cumulative"])
+    else:
+        months = pd.date_range(
+            monthly_totals.index.min(), monthly_totals.index.max(), freq="M"
+        )
+        cumulative = monthly_totals.reindex(months, fill_value=0).cumsum()
+        cumulative_sales = pd.DataFrame(
+            {"Fecha": months.strftime("%Y-%m-%d"), "cumulative": cumulative.to_numpy()}
+        )
+
+    chart = ChartData(cumulative_sales, x="Fecha")
+    return chart if columnar else chart.to_records()
+
+
+def calculate_generate_plot_data(
+    df: pd.DataFrame, top_k: Optional[int] = None, columnar: bool = False
+) -> Union[list, ChartData]:
+    """
+    Create a dictionary to store the sum of sales for each product per month.
+
+    Parameters:
+        df (pd.DataFrame): DataFrame containing sales data, with columns 'Fecha' (Date) and 'Ventas' (Sales).
+        top_k (int, optional): Maximum number of product series. The remaining products are
+                               summed into an "Other" series. None keeps every product.
+        columnar (bool): Return a `ChartData` instead of a list of dictionaries.
+
+    Returns:
+        list: A list of dictionaries containing the sum of sales for each product per month, in the format:
+              [{'Fecha': 'YYYY-MM', 'Product1': sum_sales1, 'Product2': sum_sales2, ...}, ...]
+    """
+    return plot_data_from_rollup(calculate_monthly_rollup(df), top_k, columnar)
+
 
-    data = monthly_totals.to_dict("records")
+def calculate_monthly_sales(
+    df: pd.DataFrame, columnar: bool = False
+) -> Union[list, ChartData]:
+    """
+    Calculate monthly sales and return the data in a list of dictionaries.
+
+    Parameters:
+        df (pd.DataFrame): DataFrame with sales data, containing a 'Date' column and a 'Sales' column.
+        columnar (bool): Return a `ChartData` instead of a list of dictionaries.
 
-    return data
+    Returns:
+        list: A list of dictionaries with the total monthly sales and dates in 'YYYY-MM-DD' format.
+    """
+    return monthly_sales_from_rollup(calculate_monthly_rollup(df), columnar)
 
 
-def calculate_cumulative_monthly_sales(df: pd.DataFrame) -> list:
+def calculate_cumulative_monthly_sales(
+    df: pd.DataFrame, columnar: bool = False
+) -> Union[list, ChartData]:
     """
     Calculate cumulative monthly sales and return the data in a list of dictionaries.
 
     Parameters:
         df (pd.DataFrame): DataFrame with sales data, containing a 'Date' column and a 'Sales' column.
+        columnar (bool): Return a `ChartData` instead of a list of dictionaries.
 
     Returns:
         list: A list of dictionaries with the cumulative monthly sales and dates in 'YYYY-MM-DD' format.
     """
-    df["Date"] = pd.to_datetime(df["Fecha"])
+    return cumulative_monthly_sales_from_rollup(calculate_monthly_rollup(df), columnar)
+
+
+def calculate_rolling_sales_metrics(
+    df: pd.DataFrame,
+    windows: tuple = (7, 28, 90),
+    by: str = "Región",
+    columnar: bool = False,
+) -> dict:
+    """
+    Calculate rolling and year-to-date sales and prediction metrics per group.
+
+    The daily sales and predictions of every group are laid out on a common calendar and
+    accumulated once. Every window is then the difference of two points of that cumulative
+    sum, so the cost does not depend on the number or length of the windows.
+
+    Parameters:
+        df (pd.DataFrame): DataFrame with sales data, containing 'Fecha', 'Ventas', 'Prediccion'
+                           and the `by` column.
+        windows (tuple): Rolling window lengths, in days.
+        by (str): Column to group by, e.g. 'Región' or 'Producto'.
+        columnar (bool): Return a `ChartData` per group instead of a list of dictionaries.
+
+    Returns:
+        dict: A dictionary with one list of records per group, in the format:
+              {group: [{'Fecha': 'YYYY-MM-DD', 'Ventas 7d': ..., 'Prediccion 7d': ...,
+                        'Ratio 7d': ..., ..., 'Ventas YTD': ..., 'Prediccion YTD': ...}, ...]}
+              'Ratio' is the percentage of sales over prediction, 0 when there is no prediction.
+              Only dates up to today are included.
+    """
+    df["Fecha"] = pd.to_datetime(df["Fecha"]).dt.normalize()
 
-    # Get the minimum date in the DataFrame as the initial date
-    initial_date = df["Date"].min()
+    # Daily totals per group on a contiguous calendar, as a (groups, days, 2) array
+    daily = df.groupby([by, "Fecha"])[["Ventas", "Prediccion"]].sum()
+    groups = daily.index.get_level_values(by).unique()
+    days = pd.date_range(df["Fecha"].min(), df["Fecha"].max(), freq="D")
+    daily = daily.reindex(
+        pd.MultiIndex.from_product([groups, days], names=[by, "Fecha"]), fill_value=0
+    )
+    values = daily.to_numpy(dtype="float64").reshape(len(groups), len(days), 2)
 
-    df_months = df[df["Date"] >= initial_date]
+    # Single cumulative sum with a leading zero: the sum over (i, j] is cum[j] - cum[i]
+    cumulative = np.zeros((len(groups), len(days) + 1, 2))
+    np.cumsum(values, axis=1, out=cumulative[:, 1:])
+    end = np.arange(1, len(days) + 1)
 
-    # Filter rows with sales greater than 0 to avoid zero accumulation in the future
-    df_months = df_months[df_months["Ventas"] > 0]
+    metrics = {}
+    for window in windows:
+        start = np.maximum(end - window, 0)
+        metrics[f"{window}d"] = cumulative[:, end] - cumulative[:, start]
 
-    # Group the data by month and sum the sales for each month
-    df_months = (
-        df_months.groupby(pd.Grouper(key="Fecha", freq="M"))
-        .agg({"Ventas": "sum"})
-        .reset_index()
+    # Year to date: the window starts on the first calendar day of each year
+    year_start = np.searchsorted(
+        days.values, days.to_period("Y").start_time.values, side="left"
     )
+    metrics["YTD"] = cumulative[:, end] - cumulative[:, year_start]
+
+    # Keep only the dates up to today
+    keep = days <= pd.Timestamp(dt.date.today())
+    dates = days[keep].strftime("%Y-%m-%d")
+
+    output_data = {}
+    for position, group in enumerate(groups):
+        columns = {"Fecha": dates}
+        for name, totals in metrics.items():
+            sales = totals[position, keep, 0]
+            predictions = totals[position, keep, 1]
+            columns[f"Ventas {name}"] = sales
+            columns[f"Prediccion {name}"] = predictions
+            if name != "YTD":
+                ratio = np.divide(
+                    sales,
+                    predictions,
+                    out=np.zeros_like(sales),
+                    where=predictions != 0,
+                )
+                columns[f"Ratio {name}"] = np.round(ratio * 100, 2)
+        chart = ChartData(pd.DataFrame(columns), x="Fecha")
+        output_data[group] = chart if columnar else chart.to_records()
+
+    return output_data
+
+
+def _benchmark(num_days: int = 1500, num_regions: int = 40):
+    from payload import measure_allocations, to_records
+    from prueba_acceso import generar_shard_ventas
+
+    sales_df = generar_shard_ventas(
+        pd.Timestamp("2020-01-01"),
+        num_dias=num_days,
+        num_productos=20,
+        num_regiones=num_regions,
+        semilla=np.random.SeedSequence(0),
+    ).fillna(0)
+
+    cases = {
+        "calculate_rolling_sales_metrics": calculate_rolling_sales_metrics,
+        "calculate_generate_plot_data": calculate_generate_plot_data,
+        "calculate_monthly_sales": calculate_monthly_sales,
+        "calculate_cumulative_monthly_sales": calculate_cumulative_monthly_sales,
+    }
+
+    def publish(result):
+        if isinstance(result, dict):
+            return {key: to_records(value) for key, value in result.items()}
+        return to_records(result)
 
-    # Calculate the cumulative sales column
-    df_months["cumulative"] = df_months["Ventas"].cumsum()
+    print(f"{len(sales_df)} rows, KiB allocated by tracemalloc")
+    for name, function in cases.items():
+        # Warm up, so that lazily built caches are not counted against one of the paths
+        function(sales_df.copy())
+        records_df, columnar_df = sales_df.copy(), sales_df.copy()
+        records, records_peak, records_kept = measure_allocations(
+            lambda: function(records_df)
+        )
+        chart, columnar_peak, columnar_kept = measure_allocations(
+            lambda: function(columnar_df, columnar=True)
+        )
+        published, publish_peak, _ = measure_allocations(lambda: publish(chart))
+        assert published == records
+        print(
+            f"{name}: records peak {records_peak / 1024:.0f}, "
+            f"kept {records_kept / 1024:.0f} | "
+            f"columnar peak {columnar_peak / 1024:.0f}, "
+            f"kept {columnar_kept / 1024:.0f}, "
+            f"publish peak {publish_peak / 1024:.0f}"
+        )
 
-    # Make sure the date is converted to the correct format for the Shimoku API
-    df_months["Date"] = df_months["Fecha"].dt.strftime("%Y-%m-%d")
 
-    # Create the dictionary
-    dict_list = [
-        {"Fecha": row["Date"], "cumulative": row["cumulative"]}
-        for _, row in df_months.iterrows()
-    ]
-    return dict_list
+if __name__ == "__main__":
+    _benchmark()